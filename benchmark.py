@@ -0,0 +1,359 @@
+import argparse
+import http.server
+import json
+import multiprocessing
+import os
+import random
+import socketserver
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from urllib.parse import parse_qs, urlparse
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# Offline scan benchmark: a local stand-in for the WordPress site serves a
+# generated sitemap index and N pages, and run_targeted_monitor scans it end
+# to end. Nothing here touches the real site.
+RESULTS_FILE = Path("benchmark_results.json")
+DEFAULT_PAGES = "1000,10000,100000"
+# WordPress core splits sitemaps at 2000 URLs per file
+SITEMAP_CHUNK = 2000
+SECTIONS = ['/news', '/achievements', '/products-service', '/knowhow', '/blog', '/corporate-blog', '/about', '/support']
+# WordPress REST stand-in: unchanged pages were last modified before this,
+# round r's changes r days after it
+BASE_MODIFIED = datetime(2024, 1, 1)
+# Throughput drop (vs. --compare results) reported as a regression
+REGRESSION_THRESHOLD = 0.2
+
+
+# --- Synthetic site -------------------------------------------------------
+
+class SyntheticSite:
+    def __init__(self, pages, latency=0.0, page_size=20000, change_rate=0.05, seed=1):
+        self.pages = pages
+        self.latency = latency
+        self.page_size = page_size
+        self.change_rate = change_rate
+        self.seed = seed
+        self.round = 0
+        self.listing = None
+
+    def path(self, i):
+        return f"{SECTIONS[i % len(SECTIONS)]}/post-{i}/"
+
+    def version(self, i):
+        # Last round in which page i changed (0 = never); deterministic per seed
+        for r in range(self.round, 0, -1):
+            if random.Random(f"{self.seed}:{i}:{r}").random() < self.change_rate:
+                return r
+        return 0
+
+    def sitemap_index(self, base):
+        chunks = (self.pages + SITEMAP_CHUNK - 1) // SITEMAP_CHUNK
+        entries = "".join(f"<sitemap><loc>{base}/wp-sitemap-posts-post-{n + 1}.xml</loc></sitemap>" for n in range(chunks))
+        return f'<?xml version="1.0" encoding="UTF-8"?><sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">{entries}</sitemapindex>'
+
+    def sitemap_chunk(self, base, n):
+        start = (n - 1) * SITEMAP_CHUNK
+        entries = "".join(f"<url><loc>{base}{self.path(i)}</loc></url>"
+                          for i in range(start, min(start + SITEMAP_CHUNK, self.pages)))
+        return f'<?xml version="1.0" encoding="UTF-8"?><urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">{entries}</urlset>'
+
+    def page(self, i, version):
+        links = "".join(f'<li><a href="{self.path((i + k) % self.pages)}">Related {k}</a></li>' for k in (1, 7, 31))
+        head = (f"<!DOCTYPE html><html><head><title>Benchmark post {i}</title>"
+                f'<meta name="description" content="Synthetic page {i} in {SECTIONS[i % len(SECTIONS)]}"></head>'
+                f"<body><header><nav><a href='/'>Home</a></nav></header><main><h1>Post {i}</h1>"
+                f"<p>Revision {version}</p>")
+        tail = f"<ul>{links}</ul></main><footer>Synthetic footer</footer></body></html>"
+        words = "lorem ipsum dolor sit amet remote desktop support access "
+        filler_len = max(0, self.page_size - len(head) - len(tail) - 7)
+        filler = (words * (filler_len // len(words) + 1))[:filler_len]
+        return head + f"<p>{filler}</p>" + tail
+
+    def modified_gmt(self, i, version):
+        if version:
+            modified = BASE_MODIFIED + timedelta(days=version, seconds=i)
+        else:
+            modified = BASE_MODIFIED - timedelta(minutes=i + 1)
+        return modified.strftime("%Y-%m-%dT%H:%M:%S")
+
+    def rest_posts(self):
+        # [(modified_gmt, i)] newest first, rebuilt once per round
+        if not self.listing or self.listing[0] != self.round:
+            rows = sorted(((self.modified_gmt(i, self.version(i)), i) for i in range(self.pages)), reverse=True)
+            self.listing = (self.round, rows)
+        return self.listing[1]
+
+    def lookup(self, path):
+        # Page index for a path, or None
+        try:
+            section, slug = path.rstrip('/').rsplit('/', 1)
+            i = int(slug[len("post-"):]) if slug.startswith("post-") else -1
+        except ValueError:
+            return None
+        if 0 <= i < self.pages and section == SECTIONS[i % len(SECTIONS)]:
+            return i
+        return None
+
+
+class SiteHandler(http.server.BaseHTTPRequestHandler):
+    site = None
+
+    def log_message(self, *args):
+        pass
+
+    def do_HEAD(self):
+        self.respond(head=True)
+
+    def do_GET(self):
+        self.respond()
+
+    def do_POST(self):
+        # /__round advances the change round (pages change at change_rate)
+        if self.path == "/__round":
+            self.site.round += 1
+            self.send_body(json.dumps({"round": self.site.round}).encode(), "application/json")
+        else:
+            self.send_error(404)
+
+    def send_body(self, body, content_type, etag=None, head=False, headers=None, status=200):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        if etag:
+            self.send_header("ETag", etag)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if not head:
+            self.wfile.write(body)
+
+    def respond(self, head=False):
+        site = self.site
+        if site.latency:
+            time.sleep(site.latency)
+        base = f"http://{self.headers['Host']}"
+        path = self.path.split('?')[0]
+
+        if path == "/wp-sitemap.xml":
+            return self.send_body(site.sitemap_index(base).encode(), "application/xml", head=head)
+        if path.startswith("/wp-sitemap-posts-post-") and path.endswith(".xml"):
+            n = int(path[len("/wp-sitemap-posts-post-"):-len(".xml")])
+            return self.send_body(site.sitemap_chunk(base, n).encode(), "application/xml", head=head)
+
+        if path == "/wp-json/wp/v2/posts":
+            return self.rest_posts(base, head)
+        if path == "/wp-json/wp/v2/pages":
+            return self.send_body(b"[]", "application/json", head=head, headers={"X-WP-Total": "0", "X-WP-TotalPages": "0"})
+
+        i = site.lookup(path)
+        if i is None:
+            self.send_response(404)
+            self.end_headers()
+            return
+        version = site.version(i)
+        etag = f'"{i}-{version}"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+        self.send_body(site.page(i, version).encode(), "text/html; charset=UTF-8", etag, head)
+
+
+    def rest_posts(self, base, head=False):
+        # The subset of /wp-json/wp/v2/posts a change feed uses: orderby=modified
+        # desc, modified_after, per_page/page and X-WP-Total(Pages) headers
+        query = parse_qs(urlparse(self.path).query)
+        per_page = min(int(query.get("per_page", ["10"])[0]), 100)
+        page = int(query.get("page", ["1"])[0])
+        after = query.get("modified_after", [None])[0]
+        rows = self.site.rest_posts()
+        if after:
+            rows = [r for r in rows if r[0] > after]
+        total_pages = (len(rows) + per_page - 1) // per_page
+        if page > max(total_pages, 1):
+            body = json.dumps({"code": "rest_post_invalid_page_number"}).encode()
+            return self.send_body(body, "application/json", head=head, status=400)
+        items = [{"link": base + self.site.path(i), "modified_gmt": modified}
+                 for modified, i in rows[(page - 1) * per_page:page * per_page]]
+        self.send_body(json.dumps(items).encode(), "application/json", head=head,
+                       headers={"X-WP-Total": str(len(rows)), "X-WP-TotalPages": str(total_pages)})
+
+
+class SiteServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    daemon_threads = True
+    request_queue_size = 256
+
+
+def serve(args):
+    SiteHandler.site = SyntheticSite(args.pages, args.latency, args.page_size, args.change_rate, args.seed)
+    server = SiteServer(("127.0.0.1", args.port), SiteHandler)
+    # The parent reads the bound port from the first line
+    print(server.server_address[1], flush=True)
+    server.serve_forever()
+
+
+def start_site(pages, latency, page_size, change_rate, seed):
+    # Separate process, so the server doesn't compete for the scanner's GIL
+    proc = subprocess.Popen([sys.executable, os.path.abspath(__file__), "serve", "--port", "0",
+                             "--pages", str(pages), "--latency", str(latency), "--page-size", str(page_size),
+                             "--change-rate", str(change_rate), "--seed", str(seed)],
+                            stdout=subprocess.PIPE, text=True)
+    port = int(proc.stdout.readline())
+    return proc, f"http://127.0.0.1:{port}"
+
+
+# --- Scan runner ----------------------------------------------------------
+
+def run_case(case):
+    # Runs in a fresh process with its own working directory, so state files,
+    # the page cache and peak memory don't leak between cases
+    import tracemalloc
+    os.environ["MONITOR_SITEMAP_URL"] = case["base_url"] + "/wp-sitemap.xml"
+    # The REST change feed is only consulted in --wp-feed runs
+    os.environ["MONITOR_WP_REST"] = "1" if case["wp_feed"] else "0"
+    os.chdir(case["workdir"])
+    import smart_monitor
+
+    if case["tracemalloc"]:
+        tracemalloc.start()
+
+    rounds = []
+    for n in range(case["rounds"]):
+        if n:
+            urllib.request.urlopen(urllib.request.Request(case["base_url"] + "/__round", method="POST")).read()
+            # Each later round is a new day: the baseline rotates to the last
+            # scan, so changes show up as "changed" rather than "new"
+            smart_monitor.DAILY_STATE_FILE.unlink()
+        if case["tracemalloc"]:
+            tracemalloc.reset_peak()
+        start = time.perf_counter()
+        # The first round imports every page; later rounds revisit all of them,
+        # or with --wp-feed only what the REST feed lists as modified
+        smart_monitor.run_targeted_monitor(force=n > 0 and not case["wp_feed"], fetch_budget=None)
+        elapsed = time.perf_counter() - start
+
+        meta = json.loads(Path("site_report_meta.json").read_text(encoding="utf-8"))
+        summary = json.loads(Path("site_summary.json").read_text(encoding="utf-8"))
+        fetched = meta.get("total_checked", 0)
+        metrics = meta.get("metrics", {})
+        result = {
+            "round": n + 1,
+            "seconds": round(elapsed, 3),
+            "fetched": fetched,
+            "pages_per_second": round(fetched / elapsed, 1) if elapsed else None,
+            "changed": sum(1 for row in summary if row.get("status") == "changed"),
+            "phases": metrics.get("phases", {}),
+            "parse_seconds": metrics.get("parse_seconds"),
+            "counters": metrics.get("counters", {}),
+            "errors": metrics.get("errors", {})
+        }
+        if case["tracemalloc"]:
+            result["peak_traced_mb"] = round(tracemalloc.get_traced_memory()[1] / 1024 / 1024, 1)
+        rounds.append(result)
+
+    peak_rss_mb = None
+    if resource is not None:
+        # ru_maxrss is KiB on Linux, bytes on macOS
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        peak_rss_mb = round(rss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+    return {"rounds": rounds, "peak_rss_mb": peak_rss_mb}
+
+
+def benchmark(pages, latency=0.0, page_size=20000, change_rate=0.05, rounds=2, seed=1, trace_memory=False, wp_feed=False):
+    proc, base_url = start_site(pages, latency, page_size, change_rate, seed)
+    try:
+        with tempfile.TemporaryDirectory(prefix="sp-monitor-bench-") as workdir:
+            case = {"base_url": base_url, "workdir": workdir, "rounds": rounds, "tracemalloc": trace_memory, "wp_feed": wp_feed}
+            with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+                result = pool.submit(run_case, case).result()
+    finally:
+        proc.terminate()
+        proc.wait()
+    result.update({"pages": pages, "latency": latency, "page_size": page_size, "change_rate": change_rate, "wp_feed": wp_feed})
+    return result
+
+
+def compare(results, previous):
+    # Cases whose throughput dropped more than REGRESSION_THRESHOLD
+    regressions = []
+    old = {(r["pages"], r["latency"], r["page_size"], r["change_rate"], r.get("wp_feed", False)): r for r in previous.get("results", [])}
+    for result in results:
+        before = old.get((result["pages"], result["latency"], result["page_size"], result["change_rate"], result["wp_feed"]))
+        if not before:
+            continue
+        for now_round, old_round in zip(result["rounds"], before["rounds"]):
+            if old_round["pages_per_second"] and now_round["pages_per_second"] is not None:
+                drop = 1 - now_round["pages_per_second"] / old_round["pages_per_second"]
+                if drop > REGRESSION_THRESHOLD:
+                    regressions.append(f"{result['pages']} pages, round {now_round['round']}: "
+                                       f"{old_round['pages_per_second']} -> {now_round['pages_per_second']} pages/s")
+    return regressions
+
+
+def main(args):
+    results = []
+    for pages in [int(p) for p in args.pages.split(",")]:
+        print(f"\n🏁 Benchmark: {pages} pages, latency {args.latency * 1000:.0f}ms, ~{args.page_size} bytes, change rate {args.change_rate}")
+        result = benchmark(pages, args.latency, args.page_size, args.change_rate, args.rounds, args.seed, args.tracemalloc, args.wp_feed)
+        results.append(result)
+        for r in result["rounds"]:
+            phases = ", ".join(f"{k} {v:.2f}s" for k, v in r["phases"].items())
+            memory = f", peak traced {r['peak_traced_mb']} MB" if "peak_traced_mb" in r else ""
+            print(f"   Round {r['round']}: {r['fetched']} fetched in {r['seconds']:.2f}s "
+                  f"({r['pages_per_second']} pages/s, {r['changed']} changed{memory}) [{phases}]")
+        print(f"   Peak RSS: {result['peak_rss_mb']} MB")
+
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split()[0],
+        "rounds": args.rounds,
+        "results": results
+    }
+    if args.compare:
+        previous = json.loads(Path(args.compare).read_text(encoding="utf-8"))
+        report["regressions"] = compare(results, previous)
+    Path(args.output).write_text(json.dumps(report, indent=4, ensure_ascii=False), encoding="utf-8")
+    print(f"\n💾 Results saved to {args.output}")
+
+    if report.get("regressions"):
+        print("❌ Throughput regressions:")
+        for line in report["regressions"]:
+            print(f"   {line}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline scan benchmark against a synthetic local site")
+    sub = parser.add_subparsers(dest="command")
+    for name in ("run", "serve"):
+        p = sub.add_parser(name)
+        p.add_argument("--latency", type=float, default=0.0, help="Server delay per request, in seconds")
+        p.add_argument("--page-size", type=int, default=20000, help="Approximate HTML bytes per page")
+        p.add_argument("--change-rate", type=float, default=0.05, help="Fraction of pages changing per round")
+        p.add_argument("--seed", type=int, default=1)
+    sub.choices["run"].add_argument("--pages", default=DEFAULT_PAGES, help="Comma-separated site sizes")
+    sub.choices["run"].add_argument("--rounds", type=int, default=2, help="Scans per case (1 = cold import only)")
+    sub.choices["run"].add_argument("--tracemalloc", action="store_true", help="Also record peak traced Python memory (slower)")
+    sub.choices["run"].add_argument("--wp-feed", action="store_true", help="Later rounds use the WordPress REST change feed instead of re-fetching every page")
+    sub.choices["run"].add_argument("--output", default=str(RESULTS_FILE))
+    sub.choices["run"].add_argument("--compare", help="Previous results file; exit 1 on throughput regressions")
+    sub.choices["serve"].add_argument("--pages", type=int, default=1000)
+    sub.choices["serve"].add_argument("--port", type=int, default=8765)
+    args = parser.parse_args(sys.argv[1:] if len(sys.argv) > 1 else ["run"])
+    if args.command == "serve":
+        serve(args)
+    else:
+        sys.exit(main(args))
@@ -0,0 +1,165 @@
+import hashlib
+
+from bs4 import CData, NavigableString
+
+# Structural page hashing: a page becomes a small Merkle tree of content
+# blocks, stored compactly in state as
+#   {"v": layout version, "h": root, "ch": content root,
+#    "c": {"meta": {"h": ...}, "header": {"h": ...}, "main": {"h": ..., "c": {"0": ..., "1": ...}}, "outside": ...}}
+# "ch" covers only non-template blocks, so equal content roots settle a
+# comparison without looking further, and a rotating banner or footer tweak
+# never counts as a change. "meta" is the title and meta description,
+# "outside" the body text that is neither main content nor a landmark
+# (hero and intro sections next to <main>).
+TEMPLATE_BLOCKS = ("header", "nav", "footer", "aside")
+# Bumped whenever the block layout changes: trees of different versions
+# can't be compared block by block
+VERSION = 2
+# Hex digits kept per node hash
+HASH_LENGTH = 16
+# Main content with fewer candidate sections than this stays a single leaf
+MIN_SECTIONS = 2
+
+_LANDMARKS = {
+    "header": ("header", "banner"),
+    "nav": ("nav", "navigation"),
+    "footer": ("footer", "contentinfo"),
+    "aside": ("aside", "complementary"),
+}
+
+
+def _digest(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:HASH_LENGTH]
+
+
+def _text(strings):
+    return " ".join(" ".join(strings).split())
+
+
+def _visible_strings(el, skip=()):
+    # Text nodes as get_text() sees them (no scripts, styles or comments),
+    # minus anything inside the elements in skip
+    skip_ids = set(id(s) for s in skip)
+    for s in el.find_all(string=True):
+        if type(s) not in (NavigableString, CData):
+            continue
+        if skip_ids and any(id(p) in skip_ids for p in s.parents):
+            continue
+        yield s
+
+
+def _node(children):
+    # Inner node: hash over the ordered child names and hashes
+    return {"h": _digest("|".join(f"{name}:{child['h']}" for name, child in children.items())), "c": children}
+
+
+def _leaf(el, skip=()):
+    return {"h": _digest(_text(_visible_strings(el, skip)))}
+
+
+def _outermost(elements):
+    ids = set(id(e) for e in elements)
+    return [e for e in elements if not any(id(p) in ids for p in e.parents)]
+
+
+def _landmark(body, name, exclude):
+    # The page-level landmark: the element or ARIA role, outside main/article
+    # and outside landmarks already taken (a nav inside the header)
+    tag, role = _LANDMARKS[name]
+    found = body.find_all(tag) + body.find_all(attrs={"role": role})
+    taken = set(id(e) for e in exclude)
+    found = [el for el in found if not el.find_parent(["main", "article"])
+             and id(el) not in taken and not any(id(p) in taken for p in el.parents)]
+    return _outermost(found)
+
+
+def _sections(main):
+    # Outermost section/article elements, else the element children below
+    # any single-child wrapper divs
+    sections = _outermost(main.find_all(["section", "article"]))
+    if len(sections) >= MIN_SECTIONS:
+        return sections
+    el = main
+    while True:
+        children = [c for c in el.find_all(recursive=False) if c.name not in ("script", "style", "noscript")]
+        if len(children) != 1:
+            break
+        el = children[0]
+    return children if len(children) >= MIN_SECTIONS else []
+
+
+def build_tree(soup):
+    body = soup.body or soup
+    blocks = {}
+    title = soup.title.get_text() if soup.title else ""
+    description = soup.find("meta", attrs={"name": "description"})
+    meta = _text([title, description.get("content", "") if description else ""])
+    if meta:
+        blocks["meta"] = {"h": _digest(meta)}
+    template_els = []
+    for name in TEMPLATE_BLOCKS:
+        els = _landmark(body, name, template_els)
+        if els:
+            template_els.extend(els)
+            blocks[name] = _node({str(i): _leaf(el) for i, el in enumerate(els)}) if len(els) > 1 else _leaf(els[0])
+
+    main = body.find("main") or body.find(attrs={"role": "main"})
+    if main:
+        outside = _text(_visible_strings(body, [main] + template_els))
+        if outside:
+            blocks["outside"] = {"h": _digest(outside)}
+    skip = [] if main else template_els
+    main = main or body
+    sections = _sections(main)
+    if sections:
+        children = {str(i): _leaf(el) for i, el in enumerate(sections)}
+        # Text in main outside the sections (intro, headings) is a block too
+        rest = _text(_visible_strings(main, skip + sections))
+        if rest:
+            children["rest"] = {"h": _digest(rest)}
+        blocks["main"] = _node(children)
+    else:
+        blocks["main"] = _leaf(main, skip)
+
+    tree = _node(blocks)
+    tree["ch"] = content_root(tree)
+    tree["v"] = VERSION
+    return tree
+
+
+def content_root(tree):
+    children = tree.get("c") or {}
+    return _digest("|".join(f"{name}:{child['h']}" for name, child in children.items() if name not in TEMPLATE_BLOCKS))
+
+
+def _diff(old, new, path):
+    old_c, new_c = old.get("c"), new.get("c")
+    if not old_c or not new_c:
+        return [path] if old["h"] != new["h"] else []
+    changed = []
+    for name in sorted(set(old_c) | set(new_c), key=str):
+        child_path = f"{path}/{name}"
+        o, n = old_c.get(name), new_c.get(name)
+        if o is None or n is None:
+            changed.append(child_path)
+        elif o["h"] != n["h"]:
+            changed.extend(_diff(o, n, child_path))
+    return changed
+
+
+def changed_blocks(old, new):
+    # Paths of the content blocks that differ (e.g. ["main/2"]). Equal
+    # content roots return at once; otherwise only differing subtrees are read.
+    if old.get("ch") == new.get("ch"):
+        return []
+    changed = []
+    old_c, new_c = old.get("c") or {}, new.get("c") or {}
+    for name in sorted(set(old_c) | set(new_c)):
+        if name in TEMPLATE_BLOCKS:
+            continue
+        o, n = old_c.get(name), new_c.get(name)
+        if o is None or n is None:
+            changed.append(name)
+        elif o["h"] != n["h"]:
+            changed.extend(_diff(o, n, name))
+    return changed or ["page"]
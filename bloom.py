@@ -0,0 +1,52 @@
+import hashlib
+import math
+import struct
+from pathlib import Path
+
+
+class BloomFilter:
+    # Fixed-size probabilistic seen-set: no false negatives, false positives
+    # at roughly error_rate once `capacity` items have been added
+    def __init__(self, capacity=200000, error_rate=0.001):
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item):
+        # Double hashing: h1 + i * h2 over one SHA-256 digest
+        digest = hashlib.sha256(item.encode('utf-8')).digest()
+        h1, h2 = struct.unpack_from("<QQ", digest)
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, item):
+        for pos in self._positions(item):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def update(self, items):
+        for item in items:
+            self.add(item)
+
+    def __contains__(self, item):
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+    def save(self, path):
+        path = Path(path)
+        tmp = path.with_name(path.name + ".tmp")
+        with tmp.open("wb") as f:
+            f.write(struct.pack("<QI", self.size, self.hashes))
+            f.write(self.bits)
+        tmp.replace(path)
+
+    @classmethod
+    def load(cls, path, capacity=200000, error_rate=0.001):
+        # A fresh filter if the file is missing or unreadable
+        bloom = cls(capacity, error_rate)
+        try:
+            with Path(path).open("rb") as f:
+                size, hashes = struct.unpack("<QI", f.read(12))
+                bits = bytearray(f.read())
+            if len(bits) == (size + 7) // 8:
+                bloom.size, bloom.hashes, bloom.bits = size, hashes, bits
+        except (OSError, struct.error):
+            pass
+        return bloom
@@ -1,7 +1,20 @@
 import json
+import os
+import sqlite3
+import tempfile
+from datetime import datetime
 from pathlib import Path
 from urllib.parse import urlparse, urlunparse
 
+import scan_lock
+import smart_monitor
+
+CHUNK_SIZE = 1024 * 1024
+# Inputs larger than this dedupe through an on-disk index instead of a set
+DEDUPE_MEMORY_LIMIT = 256 * 1024 * 1024
+# Characters that can continue a JSON number
+NUMBER_CHARS = frozenset('0123456789+-.eE')
+
 def normalize_url(url):
     try:
         parsed = urlparse(url)
@@ -10,50 +23,191 @@ def normalize_url(url):
     except:
         return url
 
+def iter_json_items(path):
+    # Streams the top-level container of a JSON file: yields (key, value) for
+    # an object and (None, item) for an array, holding one record at a time
+    decoder = json.JSONDecoder()
+    with path.open('r', encoding='utf-8') as f:
+        buf, pos, eof = '', 0, False
+
+        def fill():
+            nonlocal buf, pos, eof
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk:
+                eof = True
+            buf = buf[pos:] + chunk
+            pos = 0
+
+        def skip_ws():
+            nonlocal pos
+            while True:
+                while pos < len(buf) and buf[pos] in ' \t\r\n':
+                    pos += 1
+                if pos < len(buf) or eof:
+                    return
+                fill()
+
+        def decode():
+            # A number cut at the buffer edge still decodes ("0." as 0), so
+            # a value is only accepted once a character that can't continue
+            # a number follows it
+            nonlocal pos
+            while True:
+                try:
+                    value, end = decoder.raw_decode(buf, pos)
+                    if eof or (end < len(buf) and buf[end] not in NUMBER_CHARS):
+                        pos = end
+                        return value
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                fill()
+
+        def expect(chars):
+            nonlocal pos
+            skip_ws()
+            if pos >= len(buf) or buf[pos] not in chars:
+                raise ValueError(f"Expected one of {chars!r} in {path}")
+            pos += 1
+            return buf[pos - 1]
+
+        opening = expect('{[')
+        closing = '}' if opening == '{' else ']'
+        skip_ws()
+        if pos < len(buf) and buf[pos] == closing:
+            return
+        while True:
+            skip_ws()
+            key = None
+            if opening == '{':
+                key = decode()
+                expect(':')
+                skip_ws()
+            yield key, decode()
+            if expect(',' + closing) == closing:
+                return
+
+class DedupeIndex:
+    # Seen-set for normalized URLs; very large inputs spill to a temp sqlite file
+    def __init__(self, on_disk=False):
+        self.seen = None if on_disk else set()
+        self.db = None
+        if on_disk:
+            fd, self.db_path = tempfile.mkstemp(suffix=".dedupe.sqlite")
+            os.close(fd)
+            self.db = sqlite3.connect(self.db_path)
+            self.db.execute("CREATE TABLE seen (key TEXT PRIMARY KEY)")
+
+    def add(self, key):
+        # True if key was not seen before
+        if self.seen is not None:
+            if key in self.seen:
+                return False
+            self.seen.add(key)
+            return True
+        return self.db.execute("INSERT OR IGNORE INTO seen VALUES (?)", (key,)).rowcount == 1
+
+    def close(self):
+        if self.db is not None:
+            self.db.close()
+            os.unlink(self.db_path)
+
+def _dump_indented(value):
+    # Matches json.dump(..., indent=4) for a value nested one level deep
+    return json.dumps(value, indent=4, ensure_ascii=False).replace('\n', '\n    ')
+
+def _clean_items(items, is_dict, dedupe, report):
+    # Yields (normalized url, item) for the entries worth keeping
+    for key, item in items:
+        report["input"] += 1
+        url = key if is_dict else (item.get("url") if isinstance(item, dict) else None)
+        if not url or (is_dict and urlparse(url).scheme not in ['http', 'https']):
+            report["dropped"] += 1
+            continue
+
+        norm = normalize_url(url)
+        if not dedupe.add(norm):
+            report["dropped"] += 1
+            continue
+        if norm != url:
+            report["rewritten"] += 1
+        if not is_dict:
+            item["url"] = norm
+        report["output"] += 1
+        yield norm, item
+
+def _cleanup_stored(filename):
+    # Files kept in the delta store (state/) are loaded whole and saved back
+    # as a patch; they are the ones a scan already holds in memory
+    path = Path(filename)
+    data = smart_monitor.load_json(path, None)
+    if not isinstance(data, (dict, list)):
+        return None
+    is_dict = isinstance(data, dict)
+    report = {"file": filename, "input": 0, "output": 0, "rewritten": 0, "dropped": 0}
+    dedupe = DedupeIndex()
+    kept = list(_clean_items(data.items() if is_dict else ((None, item) for item in data), is_dict, dedupe, report))
+    if report["rewritten"] or report["dropped"]:
+        smart_monitor.save_json(path, dict(kept) if is_dict else [item for _, item in kept])
+    return report
+
 def cleanup_json(filename):
     file_path = Path(filename)
+    if smart_monitor.delta_store.handles(file_path) and smart_monitor.delta_store.exists(file_path):
+        report = _cleanup_stored(filename)
+        if report:
+            print(f"Cleaned {filename} (delta store): {report['input']} -> {report['output']} entries, {report['rewritten']} rewritten.")
+        return report
     if not file_path.exists():
-        return
-    
+        return None
+
     with file_path.open('r', encoding='utf-8') as f:
-        data = json.load(f)
-    
-    new_data = {}
-    if isinstance(data, dict):
-        for url, val in data.items():
-            parsed = urlparse(url)
-            if parsed.scheme not in ['http', 'https']:
-                continue 
-                
-            norm = normalize_url(url)
-            if norm not in new_data:
-                new_data[norm] = val
-        
-        with file_path.open('w', encoding='utf-8') as f:
-            json.dump(new_data, f, indent=4, ensure_ascii=False)
-        print(f"Cleaned {filename}: {len(data)} -> {len(new_data)} entries.")
-    
-    elif isinstance(data, list):
-        seen_urls = set()
-        new_list = []
-        for item in data:
-            url = item.get("url")
-            if url:
-                norm = normalize_url(url)
-                if norm not in seen_urls:
-                    seen_urls.add(norm)
-                    item["url"] = norm
-                    new_list.append(item)
-        
-        with file_path.open('w', encoding='utf-8') as f:
-            json.dump(new_list, f, indent=4, ensure_ascii=False)
-        print(f"Cleaned {filename} (list): {len(data)} -> {len(new_list)} entries.")
+        head = f.read(64).lstrip()
+    if not head or head[0] not in '{[':
+        return None
+    is_dict = head[0] == '{'
+
+    dedupe = DedupeIndex(on_disk=file_path.stat().st_size > DEDUPE_MEMORY_LIMIT)
+    tmp_path = file_path.with_name(file_path.name + ".cleanup.tmp")
+    report = {"file": filename, "input": 0, "output": 0, "rewritten": 0, "dropped": 0}
+    try:
+        with tmp_path.open('w', encoding='utf-8') as out:
+            out.write('{' if is_dict else '[')
+            for norm, item in _clean_items(iter_json_items(file_path), is_dict, dedupe, report):
+                out.write(',\n    ' if report["output"] > 1 else '\n    ')
+                if is_dict:
+                    out.write(f"{json.dumps(norm, ensure_ascii=False)}: {_dump_indented(item)}")
+                else:
+                    out.write(_dump_indented(item))
+            out.write('\n' + ('}' if is_dict else ']') if report["output"] else ('}' if is_dict else ']'))
+        os.replace(tmp_path, file_path)
+    finally:
+        dedupe.close()
+        if tmp_path.exists():
+            tmp_path.unlink()
+
+    print(f"Cleaned {filename}{'' if is_dict else ' (list)'}: {report['input']} -> {report['output']} entries, {report['rewritten']} rewritten.")
+    return report
 
 def run_cleanup():
-    cleanup_json("site_structure.json")
-    cleanup_json("site_state.json")
-    cleanup_json("site_summary.json")
+    # Cleanup rewrites the same files as a scan, so it waits for the scan lock
+    return scan_lock.run_single_flight(_run_cleanup)
+
+def reset_sync_epoch():
+    # Rewritten rows aren't in the change journal (site_changes.json), so
+    # dashboards syncing through /api/data?since= are sent back to a full load
+    meta = smart_monitor.load_json(smart_monitor.REPORT_META_FILE, None)
+    if not meta:
+        return
+    meta["sync_epoch"] = datetime.now().strftime("%Y%m%d%H%M%S%f")
+    smart_monitor.save_json(smart_monitor.REPORT_META_FILE, meta)
+
+def _run_cleanup():
+    reports = [r for r in (cleanup_json(name) for name in ["site_structure.json", "site_state.json", "site_summary.json"]) if r]
+    if any(r["rewritten"] or r["dropped"] for r in reports):
+        reset_sync_epoch()
     print("Cleanup complete.")
+    return reports
 
 if __name__ == "__main__":
     run_cleanup()
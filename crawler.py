@@ -1,84 +1,149 @@
 import requests
 from bs4 import BeautifulSoup
 from urllib.parse import urljoin, urlparse
-import json
+from urllib import robotparser
+from concurrent.futures import ThreadPoolExecutor
+import threading
 import time
 from pathlib import Path
 
+import link_graph
+import smart_monitor
+
+USER_AGENT = 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+SKIP_EXTENSIONS = ('.pdf', '.zip', '.exe', '.jpg', '.png', '.jpeg', '.gif')
+
 class SplashtopCrawler:
-    def __init__(self, base_url, max_depth=3):
+    def __init__(self, base_url, max_depth=3, max_workers=8, delay=0.1, respect_robots=True, graph=None):
         self.base_url = base_url
         self.domain = urlparse(base_url).netloc
         self.max_depth = max_depth
-        self.visited = {}
-        self.structure = {}
+        self.max_workers = max_workers
+        self.delay = delay  # Minimum seconds between requests to the same host
+        self.respect_robots = respect_robots
+        self.visited = {}   # normalized URL -> shortest depth (site_structure.json format)
+        self.structure = {} # normalized URL -> {child URL: {}}
+        self.graph = graph  # Optional link_graph.LinkGraphWriter, fed as pages complete
+
+        self.session = requests.Session()
+        self.session.headers['User-Agent'] = USER_AGENT
+        self.robots = {}
+        self.host_next = {}
+        self.host_lock = threading.Lock()
 
     def is_internal(self, url):
         parsed = urlparse(url)
         return parsed.netloc == '' or parsed.netloc == self.domain
 
     def normalize_url(self, url):
+        return link_graph.normalize_url(url)
+
+    def robots_for(self, url):
         parsed = urlparse(url)
-        # Remove fragment and query params for basic mapping
-        normalized = f"{parsed.scheme}://{parsed.netloc}{parsed.path}"
-        if normalized.endswith('/'):
-            normalized = normalized[:-1]
-        return normalized
-
-    def crawl(self, url, depth=0):
-        if depth > self.max_depth:
-            return None
+        host = f"{parsed.scheme}://{parsed.netloc}"
+        with self.host_lock:
+            if host in self.robots:
+                return self.robots[host]
+
+        rules = robotparser.RobotFileParser()
+        try:
+            response = self.session.get(f"{host}/robots.txt", timeout=10)
+            rules.parse(response.text.splitlines() if response.status_code == 200 else [])
+        except Exception:
+            rules.parse([])
+        with self.host_lock:
+            return self.robots.setdefault(host, rules)
 
-        normalized_url = self.normalize_url(url)
-        if normalized_url in self.visited and self.visited[normalized_url] <= depth:
-            return self.visited[normalized_url]
+    def allowed(self, url):
+        return not self.respect_robots or self.robots_for(url).can_fetch(USER_AGENT, url)
 
-        print(f"Crawling depth {depth}: {url}")
-        self.visited[normalized_url] = depth
+    def wait_turn(self, url):
+        # Per-host politeness: reserve the next free slot for this host, then sleep until it
+        host = urlparse(url).netloc
+        delay = self.delay
+        if self.respect_robots:
+            delay = max(delay, self.robots_for(url).crawl_delay(USER_AGENT) or 0)
+        with self.host_lock:
+            now = time.monotonic()
+            slot = max(now, self.host_next.get(host, now))
+            self.host_next[host] = slot + delay
+        if slot > now:
+            time.sleep(slot - now)
 
+    def fetch_links(self, url):
+        if not self.allowed(url):
+            print(f"Skipping (robots.txt): {url}")
+            return None
+        self.wait_turn(url)
         try:
-            response = requests.get(url, timeout=10)
+            response = self.session.get(url, timeout=10)
             if response.status_code != 200:
                 return None
-            
-            soup = BeautifulSoup(response.text, 'html.parser')
-            links = []
-            
-            for a in soup.find_all('a', href=True):
-                href = a['href']
-                full_url = urljoin(url, href)
-                
-                if self.is_internal(full_url):
-                    norm_child = self.normalize_url(full_url)
-                    # Stay within domain and avoid certain file types
-                    if not any(norm_child.lower().endswith(ext) for ext in ['.pdf', '.zip', '.exe', '.jpg', '.png', '.jpeg', '.gif']):
-                        if norm_child not in self.visited or self.visited[norm_child] > depth + 1:
-                            links.append(full_url)
-
-            # Deduplicate and sort
-            links = sorted(list(set(links)))
-            
-            children_structure = {}
-            for link in links:
-                res = self.crawl(link, depth + 1)
-                if res is not None or depth + 1 <= self.max_depth:
-                    children_structure[self.normalize_url(link)] = {}
-
-            return children_structure
-
         except Exception as e:
             print(f"Error crawling {url}: {e}")
             return None
 
-def start_crawl(base_url="https://www.splashtop.co.jp/", max_depth=2, output_file="site_structure.json"):
-    crawler = SplashtopCrawler(base_url, max_depth=max_depth)
-    crawler.crawl(base_url)
-    
-    output_path = Path(output_file)
-    with output_path.open("w", encoding="utf-8") as f:
-        json.dump(crawler.visited, f, indent=4, ensure_ascii=False)
-    
-    print(f"\nCrawl complete. Results saved to {output_file}")
+        soup = BeautifulSoup(response.text, 'html.parser')
+        links = {}
+        for a in soup.find_all('a', href=True):
+            full_url = urljoin(url, a['href']).split('#')[0]
+            if not full_url.startswith('http') or not self.is_internal(full_url):
+                continue
+            norm_child = self.normalize_url(full_url)
+            # Stay within domain and avoid certain file types
+            if norm_child.lower().endswith(SKIP_EXTENSIONS):
+                continue
+            links.setdefault(norm_child, full_url)
+        return links
+
+    def crawl(self, url=None):
+        # Breadth-first: each depth level is fetched concurrently, and a page
+        # is queued only the first time it is seen, so it keeps its shortest depth
+        start_url = url or self.base_url
+        self.visited = {self.normalize_url(start_url): 0}
+        if self.graph:
+            self.graph.add_node(self.normalize_url(start_url), 0)
+        frontier = [start_url]
+        depth = 0
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            while frontier and depth < self.max_depth:
+                print(f"Crawling depth {depth}: {len(frontier)} pages")
+                next_frontier = []
+                for page_url, links in zip(frontier, pool.map(self.fetch_links, frontier)):
+                    if links is None:
+                        continue
+                    self.structure[self.normalize_url(page_url)] = {link: {} for link in links}
+                    for norm_child, full_url in links.items():
+                        if norm_child not in self.visited:
+                            self.visited[norm_child] = depth + 1
+                            next_frontier.append(full_url)
+                            if self.graph:
+                                self.graph.add_node(norm_child, depth + 1)
+                    if self.graph:
+                        self.graph.add_links(self.normalize_url(page_url), links)
+                frontier = next_frontier
+                depth += 1
+
+        # Pages at max_depth are recorded but not fetched: their links would
+        # only lead past the depth limit
+        return self.visited
+
+def start_crawl(base_url="https://www.splashtop.co.jp/", max_depth=2, output_file="site_structure.json", max_workers=8, graph_file=link_graph.GRAPH_FILE, index_file=link_graph.INDEX_FILE):
+    # Links stream to graph_file as pages complete; if the crawl dies,
+    # `python link_graph.py structure` rebuilds the structure from it
+    graph = link_graph.LinkGraphWriter(graph_file)
+    crawler = SplashtopCrawler(base_url, max_depth=max_depth, max_workers=max_workers, graph=graph)
+    try:
+        crawler.crawl(base_url)
+    finally:
+        graph.close()
+    link_graph.build_index(graph_file, index_file)
+
+    # Through save_json, so the structure lands in the delta store when it is on
+    smart_monitor.save_json(Path(output_file), crawler.visited)
+
+    print(f"\nCrawl complete. {len(crawler.visited)} pages. Results saved to {output_file}")
     return crawler.visited
 
 if __name__ == "__main__":
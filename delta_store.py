@@ -0,0 +1,247 @@
+import json
+import os
+from collections import Counter
+from pathlib import Path
+
+# Delta persistence for the large data files, so a scheduled run commits a
+# small patch instead of rewriting every file. Each file becomes
+#   state/<name>.base.json    {"generation": g, "data": full content at compaction}
+#   state/<name>.delta.jsonl  one patch per save (see _diff)
+# Patches only apply to the base of the same generation, so a compaction
+# interrupted between writing the base and clearing the log is harmless.
+DELTA_DIR = Path("state")
+# Patches kept before they are folded into a new base
+COMPACT_AFTER = 30
+# ...or once the patch log outgrows this fraction of the base
+COMPACT_RATIO = 0.5
+
+# Per file: row key for lists (None for dicts, keyed by their own keys),
+# whether row order matters (the history and the change journal are
+# append-only, summary rows come out of a set in any order), and "remap"
+# fields that a scan moves from one shared value to another on many records
+# (timestamps): a patch stores "old value -> new value" once instead of the
+# new value on every record.
+FILES = {
+    "site_state.json": (None, False, ("last_checked",)),
+    "site_state_daily.json": (None, False, ()),
+    "site_structure.json": (None, False, ()),
+    "site_summary.json": (lambda row: row.get("url"), False, ("last_checked", "baseline_date")),
+    "monitoring_history.json": (lambda row: f"{row.get('seq')}|{row.get('timestamp')}", True, ()),
+    "site_changes.json": (lambda row: f"{row.get('seq')}|{row.get('timestamp')}", True, ()),
+}
+# The daily baseline is a copy of the state taken at rotation; it is stored
+# as a pointer into the state's log rather than a second copy
+REFS = {"site_state_daily.json": "site_state.json"}
+
+
+def enabled():
+    # Opt in with MONITOR_DELTA_STATE=1 (or --delta-state); once the store
+    # exists it stays in use
+    return os.environ.get("MONITOR_DELTA_STATE") == "1" or DELTA_DIR.is_dir()
+
+
+def handles(path):
+    return Path(path).name in FILES and enabled()
+
+
+def _paths(name, directory=None):
+    directory = Path(directory) if directory is not None else DELTA_DIR
+    stem = Path(name).name.rsplit(".", 1)[0]
+    return directory / f"{stem}.base.json", directory / f"{stem}.delta.jsonl"
+
+
+def exists(name, directory=None):
+    return _paths(name, directory)[0].exists()
+
+
+def signature(name, directory=None):
+    # Changes whenever the stored content may have (for read caches)
+    sig = []
+    for p in _paths(name, directory):
+        try:
+            stat = p.stat()
+            sig.append((stat.st_mtime_ns, stat.st_size))
+        except OSError:
+            sig.append(None)
+    return tuple(sig)
+
+
+def _keyed(name, data):
+    key = FILES[Path(name).name][0]
+    if key is None:
+        return dict(data)
+    return {key(row): row for row in data}
+
+
+def _unkeyed(name, keyed):
+    return keyed if FILES[Path(name).name][0] is None else list(keyed.values())
+
+
+def _apply(keyed, patch):
+    # In order: deletions, remapped values, whole new records, changed
+    # fields, removed fields
+    for k in patch.get("del", []):
+        keyed.pop(k, None)
+    for field, pairs in patch.get("remap", {}).items():
+        mapping = {json.dumps(old): new for old, new in pairs}
+        for k, record in keyed.items():
+            if isinstance(record, dict) and field in record and json.dumps(record[field]) in mapping:
+                keyed[k] = dict(record, **{field: mapping[json.dumps(record[field])]})
+    keyed.update(patch.get("set", {}))
+    for k, fields in patch.get("upd", {}).items():
+        keyed[k] = dict(keyed[k], **fields)
+    for k, fields in patch.get("unset", {}).items():
+        keyed[k] = {f: v for f, v in keyed[k].items() if f not in fields}
+
+
+def _read(name, directory=None, upto=None):
+    # (generation, keyed content, patch count, ref) or None; with upto,
+    # only the first `upto` patches are applied
+    base_path, delta_path = _paths(name, directory)
+    try:
+        with base_path.open("r", encoding="utf-8") as f:
+            base = json.load(f)
+    except (OSError, ValueError):
+        return None
+    generation = base.get("generation", 0)
+    ref = base.get("ref")
+    if ref:
+        target = _read(ref["name"], directory, upto=ref["patches"])
+        if target is None or target[0] != ref["generation"]:
+            return None
+        keyed = target[1]
+    else:
+        keyed = _keyed(name, base.get("data") or [])
+    patches = 0
+    try:
+        with delta_path.open("r", encoding="utf-8") as f:
+            for line in f:
+                if upto is not None and patches >= upto:
+                    break
+                try:
+                    patch = json.loads(line)
+                except ValueError:
+                    # Torn last line of an interrupted save
+                    continue
+                if patch.get("g") != generation:
+                    continue
+                _apply(keyed, patch)
+                patches += 1
+    except OSError:
+        pass
+    return generation, keyed, patches, ref
+
+
+def load(name, default=None, directory=None):
+    stored = _read(name, directory)
+    if stored is None:
+        return default
+    return _unkeyed(name, stored[1])
+
+
+def _write_base(name, base, directory=None):
+    base_path, delta_path = _paths(name, directory)
+    base_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = base_path.with_name(base_path.name + ".tmp")
+    with tmp.open("w", encoding="utf-8") as f:
+        json.dump(base, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp, base_path)
+    # Stale patches no longer match the generation; clear them anyway
+    delta_path.write_text("", encoding="utf-8")
+
+
+def _diff(name, old, new):
+    # Patch turning keyed content old into new:
+    #   {"del": [key], "remap": {field: [[old value, new value]]},
+    #    "set": {key: record}, "upd": {key: {field: value}}, "unset": {key: [field]}}
+    patch = {}
+    removed = [k for k in old if k not in new]
+    if removed:
+        patch["del"] = removed
+    current = {k: v for k, v in old.items() if k in new}
+    remap = {}
+    for field in FILES[Path(name).name][2]:
+        moves = Counter((json.dumps(current[k][field]), json.dumps(new[k][field])) for k in current
+                        if isinstance(current[k], dict) and isinstance(new[k], dict)
+                        and field in current[k] and field in new[k])
+        # Each old value maps to where most of its records went, if they
+        # moved at all and there is more than one of them
+        best = {}
+        for (before, after), n in moves.most_common():
+            best.setdefault(before, (after, n))
+        pairs = [[json.loads(before), json.loads(after)] for before, (after, n) in best.items() if before != after and n > 1]
+        if pairs:
+            remap[field] = pairs
+    if remap:
+        patch["remap"] = remap
+        _apply(current, {"remap": remap})
+    for k, record in new.items():
+        if k not in current:
+            patch.setdefault("set", {})[k] = record
+        elif current[k] != record:
+            if isinstance(record, dict) and isinstance(current[k], dict):
+                changed = {f: v for f, v in record.items() if f not in current[k] or current[k][f] != v}
+                gone = [f for f in current[k] if f not in record]
+                if changed:
+                    patch.setdefault("upd", {})[k] = changed
+                if gone:
+                    patch.setdefault("unset", {})[k] = gone
+            else:
+                patch.setdefault("set", {})[k] = record
+    return patch
+
+
+def _materialize_refs(name, directory=None):
+    # Before name's log is compacted away, turn pointers into it into copies
+    for alias, target in REFS.items():
+        if target != Path(name).name:
+            continue
+        stored = _read(alias, directory)
+        if stored is not None and stored[3]:
+            _write_base(alias, {"generation": stored[0] + 1, "data": _unkeyed(alias, stored[1])}, directory)
+
+
+def save(name, data, directory=None):
+    # Appends a patch from the stored content to data (nothing if equal),
+    # or writes a fresh base when there is none or it is time to compact.
+    # A daily baseline equal to the current state becomes a pointer to it.
+    name = Path(name).name
+    stored = _read(name, directory)
+    target = REFS.get(name)
+    if target:
+        current = _read(target, directory)
+        if current is not None and current[1] == _keyed(target, data):
+            ref = {"name": target, "generation": current[0], "patches": current[2]}
+            _write_base(name, {"generation": (stored[0] if stored else 0) + 1, "ref": ref}, directory)
+            return "ref"
+    if stored is None:
+        _write_base(name, {"generation": 1, "data": data}, directory)
+        return "base"
+    generation, old, patches, _ = stored
+    base_path, delta_path = _paths(name, directory)
+    try:
+        log_size = delta_path.stat().st_size
+    except OSError:
+        log_size = 0
+    new = _keyed(name, data)
+    if FILES[name][1] and list(new)[:len([k for k in old if k in new])] != [k for k in old if k in new]:
+        # Reordered rows can't be expressed as a patch
+        log_size = None
+    if log_size is None or patches >= COMPACT_AFTER or log_size > base_path.stat().st_size * COMPACT_RATIO:
+        _materialize_refs(name, directory)
+        _write_base(name, {"generation": generation + 1, "data": data}, directory)
+        return "compacted"
+
+    patch = _diff(name, old, new)
+    if not patch:
+        return "unchanged"
+    patch["g"] = generation
+    with delta_path.open("a", encoding="utf-8") as f:
+        f.write(json.dumps(patch, ensure_ascii=False, separators=(",", ":")) + "\n")
+    return "patched"
+
+
+def remove(name, directory=None):
+    for p in _paths(name, directory):
+        if p.exists():
+            p.unlink()
@@ -0,0 +1,57 @@
+import json
+import os
+from pathlib import Path
+from urllib.parse import urlparse
+
+# Fetch order for a scan, and the URLs a budget-limited run left unfetched.
+# Carried-over URLs go to the front of the next run's queue (after new URLs):
+#   {"updated": iso, "urls": [url, ...]}
+QUEUE_FILE = Path("site_fetch_queue.json")
+
+
+def load(path=QUEUE_FILE):
+    try:
+        with Path(path).open("r", encoding="utf-8") as f:
+            return json.load(f).get("urls", [])
+    except (OSError, ValueError, AttributeError):
+        return []
+
+
+def save(urls, now_iso, path=QUEUE_FILE):
+    path = Path(path)
+    tmp = path.with_name(path.name + ".tmp")
+    with tmp.open("w", encoding="utf-8") as f:
+        json.dump({"updated": now_iso, "urls": urls}, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+
+
+def section(url):
+    parts = [p for p in urlparse(url).path.split("/") if p]
+    return "/" + parts[0] if parts else "/"
+
+
+def section_rates(state):
+    # Mean learned change rate (changes/day) of the pages in each section
+    totals = {}
+    for url, entry in state.items():
+        rate = entry.get("change_rate")
+        if rate is not None:
+            total = totals.setdefault(section(url), [0.0, 0])
+            total[0] += rate
+            total[1] += 1
+    return {name: total / count for name, (total, count) in totals.items()}
+
+
+def order(urls, new_urls, carried, state):
+    # New URLs first (those never fetched at all ahead of ones an earlier run
+    # today already has), then the rest; within each, URLs a previous run
+    # didn't get to lead, followed by section volatility and the page's own
+    # change rate
+    rates = section_rates(state)
+    carried = set(carried)
+
+    def key(url):
+        return (url not in new_urls, url in state, url not in carried,
+                -rates.get(section(url), 0.0), -(state.get(url, {}).get("change_rate") or 0.0), url)
+
+    return sorted(urls, key=key)
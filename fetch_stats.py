@@ -0,0 +1,97 @@
+import json
+import math
+import os
+from pathlib import Path
+
+# Rolling per-URL fetch telemetry written by each scan:
+#   {"updated": iso, "window": n, "summary": report(), "urls": {url: [sample, ...]}}
+# A sample is [timestamp, ttfb_ms, total_ms, bytes, status] (status None = network error;
+# bytes only for 200s, since a 304 revalidation has no body to measure)
+STATS_FILE = Path("site_fetch_stats.json")
+# Samples kept per URL
+WINDOW = 20
+# Rows in the slowest / largest lists
+TOP_N = 20
+
+
+def load(path=STATS_FILE):
+    try:
+        with Path(path).open("r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save(stats, path=STATS_FILE):
+    path = Path(path)
+    tmp = path.with_name(path.name + ".tmp")
+    with tmp.open("w", encoding="utf-8") as f:
+        json.dump(stats, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp, path)
+
+
+def record(stats, infos, now_iso, keep_urls=None):
+    # Appends the "fetch" telemetry of get_page_info results. URLs outside
+    # keep_urls (e.g. pages gone from the state) are dropped.
+    urls = dict(stats.get("urls", {}))
+    for info in infos:
+        fetch = info.get("fetch")
+        if not fetch:
+            continue
+        size = fetch.get("bytes") if fetch.get("status") == 200 else None
+        sample = [now_iso, fetch.get("ttfb_ms"), fetch.get("total_ms"), size, fetch.get("status")]
+        urls[info["url"]] = (urls.get(info["url"], []) + [sample])[-WINDOW:]
+    if keep_urls is not None:
+        urls = {url: samples for url, samples in urls.items() if url in keep_urls}
+    return {"updated": now_iso, "window": WINDOW, "summary": report(urls), "urls": urls}
+
+
+def percentile(values, p):
+    # Nearest-rank percentile of a sorted list
+    if not values:
+        return None
+    return values[max(0, math.ceil(p / 100 * len(values)) - 1)]
+
+
+def _median(values):
+    values = sorted(v for v in values if v is not None)
+    return percentile(values, 50)
+
+
+def report(urls, top=TOP_N):
+    ttfb, total, sizes, statuses = [], [], [], {}
+    per_url = []
+    for url, samples in urls.items():
+        for _, t, d, b, status in samples:
+            if t is not None: ttfb.append(t)
+            if d is not None: total.append(d)
+            if b is not None and status == 200: sizes.append(b)
+            key = str(status) if status is not None else "error"
+            statuses[key] = statuses.get(key, 0) + 1
+        per_url.append({
+            "url": url,
+            "samples": len(samples),
+            "ttfb_ms": _median(s[1] for s in samples),
+            "total_ms": _median(s[2] for s in samples),
+            # Median size of the full (200) responses in the window
+            "bytes": _median(s[3] for s in samples if s[4] == 200),
+            "status": samples[-1][4]
+        })
+    ttfb.sort()
+    total.sort()
+    sizes.sort()
+
+    def spread(values):
+        return {f"p{p}": percentile(values, p) for p in (50, 95, 99)}
+
+    return {
+        "samples": len(total),
+        "urls": len(urls),
+        "ttfb_ms": spread(ttfb),
+        "total_ms": spread(total),
+        "bytes": spread(sizes),
+        "status": statuses,
+        # Per URL: median over its window, so one slow fetch doesn't dominate
+        "slowest": sorted((r for r in per_url if r["total_ms"] is not None), key=lambda r: -r["total_ms"])[:top],
+        "largest": sorted((r for r in per_url if r["bytes"] is not None), key=lambda r: -r["bytes"])[:top]
+    }
@@ -0,0 +1,137 @@
+import base64
+
+try:
+    import numpy as np
+except ImportError:
+    # Optional: without NumPy pages get no fingerprint and the
+    # template/near-duplicate analysis is skipped
+    np = None
+
+# MinHash fingerprints of page text, for telling a sitewide template change
+# (the same shingles added or removed on many pages) apart from real edits,
+# and for clustering near-duplicate pages with LSH banding.
+NUM_PERM = 64
+# Character shingles: whitespace-insensitive and works for Japanese text
+SHINGLE = 5
+# LSH: BANDS x ROWS = NUM_PERM; candidates share a whole band
+BANDS = 8
+ROWS = NUM_PERM // BANDS
+# Estimated Jaccard similarity for two pages to count as near-duplicates
+DUPLICATE_THRESHOLD = 0.8
+# A sitewide change needs at least this many changed pages showing the same
+# MinHash value moves; a (slot, value) two or more pages moved to is
+# attributed to shared markup, since page-specific text almost never collides
+TEMPLATE_MIN_PAGES = 5
+CHUNK = 4096
+
+if np is not None:
+    _rng = np.random.RandomState(20240601)
+    _A = _rng.randint(1, 1 << 62, size=NUM_PERM, dtype=np.uint64) | np.uint64(1)
+    _B = _rng.randint(0, 1 << 62, size=NUM_PERM, dtype=np.uint64)
+
+
+def available():
+    return np is not None
+
+
+def signature(text):
+    # base64 of NUM_PERM uint32 minimums, or None (no NumPy / no text)
+    if np is None:
+        return None
+    text = " ".join(text.split())
+    if len(text) < SHINGLE:
+        return None
+    codes = np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+    # Polynomial hash of every SHINGLE-character window (wrapping uint64)
+    n = len(codes) - SHINGLE + 1
+    shingles = np.zeros(n, dtype=np.uint64)
+    with np.errstate(over="ignore"):
+        for j in range(SHINGLE):
+            shingles = shingles * np.uint64(1000003) + codes[j:j + n]
+        shingles = np.unique(shingles)
+        mins = np.full(NUM_PERM, np.iinfo(np.uint64).max, dtype=np.uint64)
+        for start in range(0, len(shingles), CHUNK):
+            chunk = shingles[start:start + CHUNK, None]
+            # Multiply-shift hashing: the top 32 bits of a*x + b
+            hashed = (chunk * _A + _B) >> np.uint64(32)
+            mins = np.minimum(mins, hashed.min(axis=0))
+    return base64.b64encode(mins.astype("<u4").tobytes()).decode("ascii")
+
+
+def _matrix(signatures):
+    return np.frombuffer(b"".join(base64.b64decode(s) for s in signatures), dtype="<u4").reshape(len(signatures), NUM_PERM)
+
+
+def template_changes(pairs):
+    # pairs: {url: (old_signature, new_signature)} for pages whose content
+    # changed. When enough of them moved MinHash slots to the same new
+    # values (a sitewide template change), returns the URLs whose every
+    # moved slot is explained by those shared values. Only the value a slot
+    # moved to counts: template shingles are the minimum on many pages, so a
+    # page-specific edit also moves slots away from a common value. Pages
+    # whose signature did not move at all are left to the caller.
+    pairs = {url: sigs for url, sigs in pairs.items() if sigs[0] and sigs[1]}
+    if np is None or len(pairs) < TEMPLATE_MIN_PAGES:
+        return set()
+    urls = sorted(pairs)
+    old = _matrix([pairs[u][0] for u in urls]).astype(np.uint64)
+    new = _matrix([pairs[u][1] for u in urls]).astype(np.uint64)
+    moved = old != new
+    slots = np.broadcast_to(np.arange(NUM_PERM, dtype=np.uint64) << np.uint64(32), old.shape)
+    old_keys, new_keys = slots | old, slots | new
+
+    # One vectorized pass: every (slot, value) two or more pages moved to,
+    # and more of them than already had it (pages dropping text of their own
+    # fall back to values common to the site, which is not new markup)
+    values, counts = np.unique(new_keys[moved], return_counts=True)
+    had_values, had_counts = np.unique(old_keys, return_counts=True)
+    pos = np.minimum(np.searchsorted(had_values, values), len(had_values) - 1)
+    had = np.where(had_values[pos] == values, had_counts[pos], 0)
+    shared = values[(counts >= 2) & (counts > had)]
+    from_template = moved & np.isin(new_keys, shared)
+    if from_template.any(axis=1).sum() < TEMPLATE_MIN_PAGES:
+        return set()
+    template_only = moved.any(axis=1) & ~(moved & ~from_template).any(axis=1)
+    return set(u for u, flag in zip(urls, template_only) if flag)
+
+
+def near_duplicates(signatures):
+    # signatures: {url: signature}. Clusters of near-duplicate pages via LSH
+    # banding, verified by estimated Jaccard similarity.
+    signatures = {url: sig for url, sig in signatures.items() if sig}
+    if np is None or len(signatures) < 2:
+        return []
+    urls = sorted(signatures)
+    matrix = _matrix([signatures[u] for u in urls])
+    parent = list(range(len(urls)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for band in range(BANDS):
+        buckets = {}
+        rows = np.ascontiguousarray(matrix[:, band * ROWS:(band + 1) * ROWS])
+        for i, key in enumerate(rows.view(np.dtype((np.void, rows.dtype.itemsize * ROWS))).ravel()):
+            buckets.setdefault(key.tobytes(), []).append(i)
+        for members in buckets.values():
+            if len(members) < 2:
+                continue
+            similar = (matrix[members[1:]] == matrix[members[0]]).mean(axis=1) >= DUPLICATE_THRESHOLD
+            for j, ok in zip(members[1:], similar):
+                if ok:
+                    parent[find(j)] = find(members[0])
+
+    clusters = {}
+    for i in range(len(urls)):
+        clusters.setdefault(find(i), []).append(i)
+    result = []
+    for members in clusters.values():
+        if len(members) < 2:
+            continue
+        sub = matrix[members]
+        similarity = float((sub[1:] == sub[0]).mean())
+        result.append({"size": len(members), "similarity": round(similarity, 3), "urls": [urls[i] for i in members]})
+    return sorted(result, key=lambda c: -c["size"])
@@ -0,0 +1,101 @@
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+
+# Downsampled history series for the dashboard chart. After each scan the
+# full-range series is precomputed at a few point budgets:
+#   {"updated": iso, "points": n, "levels": {metric: {"100": [[timestamp, value], ...], ...}}}
+# so a chart never has to load every history entry.
+SERIES_FILE = Path("site_history_series.json")
+METRICS = ("total_count", "new_count", "deleted_count", "changed_count")
+LEVELS = (100, 250, 500, 1000)
+# Requests are clamped to this many points
+MAX_WIDTH = 4000
+
+
+def _epoch(timestamp):
+    try:
+        return datetime.fromisoformat(timestamp).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+def raw_series(history, metric, start=None, end=None):
+    # [[timestamp, value], ...] of history entries in [start, end] (ISO strings)
+    points = []
+    for entry in history:
+        timestamp, value = entry.get("timestamp"), entry.get(metric)
+        if timestamp is None or value is None:
+            continue
+        if (start and timestamp < start) or (end and timestamp > end):
+            continue
+        points.append([timestamp, value])
+    return points
+
+
+def lttb(points, threshold):
+    # Largest-Triangle-Three-Buckets (Steinarsson 2013): keeps the first and
+    # last point, and from each bucket the point forming the largest
+    # triangle with the previous pick and the next bucket's average
+    if threshold >= len(points) or threshold < 3:
+        return list(points)
+    xs = [_epoch(p[0]) for p in points]
+    ys = [p[1] for p in points]
+    every = (len(points) - 2) / (threshold - 2)
+    picked = [points[0]]
+    a = 0
+    for i in range(threshold - 2):
+        start, end = int(i * every) + 1, int((i + 1) * every) + 1
+        next_start, next_end = end, min(int((i + 2) * every) + 1, len(points))
+        avg_x = sum(xs[next_start:next_end]) / (next_end - next_start)
+        avg_y = sum(ys[next_start:next_end]) / (next_end - next_start)
+        best, best_area = start, -1.0
+        for j in range(start, end):
+            area = abs((xs[a] - avg_x) * (ys[j] - ys[a]) - (xs[a] - xs[j]) * (avg_y - ys[a]))
+            if area > best_area:
+                best, best_area = j, area
+        picked.append(points[best])
+        a = best
+    picked.append(points[-1])
+    return picked
+
+
+def build(history, now_iso=None):
+    levels = {}
+    for metric in METRICS:
+        raw = raw_series(history, metric)
+        levels[metric] = {str(n): lttb(raw, n) for n in LEVELS if n < len(raw)}
+    return {"updated": now_iso or datetime.now().isoformat(), "points": len(history), "levels": levels}
+
+
+def query(history, precomputed, metric="total_count", width=500, start=None, end=None):
+    # Series for a chart `width` points wide. The full range comes from the
+    # smallest precomputed level that is still at least `width` points;
+    # sub-ranges (or a stale file) are downsampled from the raw entries.
+    width = max(3, min(int(width), MAX_WIDTH))
+    levels = (precomputed or {}).get("levels", {}).get(metric, {})
+    fresh = (precomputed or {}).get("points") == len(history)
+    if fresh and not start and not end:
+        fits = sorted((int(n) for n in levels if int(n) >= width))
+        if fits:
+            return {"metric": metric, "source": f"level-{fits[0]}", "total": len(history),
+                    "points": lttb(levels[str(fits[0])], width)}
+    raw = raw_series(history, metric, start, end)
+    return {"metric": metric, "source": "raw", "total": len(raw), "points": lttb(raw, width)}
+
+
+def load(path=SERIES_FILE):
+    try:
+        with Path(path).open("r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save(series, path=SERIES_FILE):
+    path = Path(path)
+    tmp = path.with_name(path.name + ".tmp")
+    with tmp.open("w", encoding="utf-8") as f:
+        json.dump(series, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp, path)
@@ -0,0 +1,134 @@
+import base64
+import gzip
+import json
+import threading
+from datetime import timedelta
+from io import BytesIO
+from pathlib import Path
+
+import requests
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+# Record / replay of every HTTP exchange a scan makes, for reproducing a
+# production run offline. The archive is gzip-compressed JSON lines:
+#   {"method", "url", "status", "reason", "headers", "body" | "body_b64", "elapsed"}
+DEFAULT_ARCHIVE = Path("scan_archive.jsonl.gz")
+
+# Conditional headers are stripped while recording so every archived
+# response carries a full body; replay answers them with a synthesized 304
+CONDITIONAL_HEADERS = ("If-None-Match", "If-Modified-Since")
+
+
+class RecordingAdapter(HTTPAdapter):
+    def __init__(self, path, **kwargs):
+        super().__init__(**kwargs)
+        self.path = Path(path)
+        self.out = gzip.open(self.path, "wt", encoding="utf-8")
+        self.lock = threading.Lock()
+        self.count = 0
+
+    def send(self, request, **kwargs):
+        for name in CONDITIONAL_HEADERS:
+            request.headers.pop(name, None)
+        response = super().send(request, **kwargs)
+        body = response.content
+        record = {
+            "method": request.method,
+            "url": request.url,
+            "status": response.status_code,
+            "reason": response.reason,
+            "headers": dict(response.headers),
+            "elapsed": response.elapsed.total_seconds()
+        }
+        try:
+            record["body"] = body.decode("utf-8")
+        except UnicodeDecodeError:
+            record["body_b64"] = base64.b64encode(body).decode("ascii")
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self.lock:
+            self.out.write(line)
+            self.count += 1
+        return response
+
+    def close(self):
+        super().close()
+        with self.lock:
+            if not self.out.closed:
+                self.out.close()
+
+
+class ReplayAdapter(BaseAdapter):
+    # Serves requests from an archive; anything not archived fails like an
+    # unreachable host, so a replay never touches the network
+    def __init__(self, path):
+        super().__init__()
+        self.path = Path(path)
+        self.exchanges = {}
+        self.lock = threading.Lock()
+        self.count = 0
+        self.misses = 0
+        with gzip.open(self.path, "rt", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # Truncated tail of an interrupted recording
+                    continue
+                self.exchanges.setdefault((record["method"], record["url"]), []).append(record)
+
+    def _next(self, key):
+        # Repeated requests replay in recorded order; the last one repeats
+        with self.lock:
+            queue = self.exchanges.get(key)
+            if not queue:
+                self.misses += 1
+                return None
+            self.count += 1
+            return queue.pop(0) if len(queue) > 1 else queue[0]
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        record = self._next((request.method, request.url))
+        if record is None:
+            raise requests.ConnectionError(f"Not in HTTP archive {self.path}: {request.method} {request.url}", request=request)
+
+        headers = CaseInsensitiveDict(record["headers"])
+        status = record["status"]
+        body = base64.b64decode(record["body_b64"]) if "body_b64" in record else record.get("body", "").encode("utf-8")
+        etag, last_modified = headers.get("ETag"), headers.get("Last-Modified")
+        if status == 200 and ((etag and request.headers.get("If-None-Match") == etag) or
+                              (last_modified and request.headers.get("If-Modified-Since") == last_modified)):
+            status, body = 304, b""
+
+        response = requests.Response()
+        response.status_code = status
+        response.reason = "Not Modified" if status == 304 else record.get("reason")
+        response.headers = headers
+        response.encoding = get_encoding_from_headers(headers)
+        response.raw = BytesIO(body)
+        response._content = body
+        response._content_consumed = True
+        response.url = request.url
+        response.request = request
+        response.elapsed = timedelta(seconds=record.get("elapsed", 0))
+        return response
+
+    def close(self):
+        pass
+
+
+def record(session, path=DEFAULT_ARCHIVE, pool_maxsize=10):
+    adapter = RecordingAdapter(path, pool_maxsize=pool_maxsize)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    print(f"⏺️ Recording HTTP exchanges to {path}")
+    return adapter
+
+
+def replay(session, path=DEFAULT_ARCHIVE):
+    adapter = ReplayAdapter(path)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    print(f"⏯️ Replaying HTTP exchanges from {path} ({sum(len(v) for v in adapter.exchanges.values())} archived)")
+    return adapter
@@ -0,0 +1,188 @@
+import json
+import sys
+from pathlib import Path
+from urllib.parse import urlparse
+
+# Crawl output, appended line by line while the crawl runs:
+#   {"node": url, "depth": d}    first time a page is discovered
+#   {"src": url, "dst": [urls]}  outgoing links of a fetched page
+GRAPH_FILE = Path("site_links.jsonl")
+# Compact adjacency index built from the JSONL (CSR-style integer arrays)
+INDEX_FILE = Path("site_links_index.json")
+
+
+def normalize_url(url):
+    # Graph keys: no query or fragment, no trailing slash (the crawler's
+    # form; sitemap and state URLs keep their trailing slash)
+    parsed = urlparse(url)
+    normalized = f"{parsed.scheme}://{parsed.netloc}{parsed.path}"
+    if normalized.endswith('/'):
+        normalized = normalized[:-1]
+    return normalized
+
+
+class LinkGraphWriter:
+    def __init__(self, path=GRAPH_FILE):
+        self.path = Path(path)
+        self.f = self.path.open("w", encoding="utf-8")
+
+    def _write(self, record):
+        self.f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def add_node(self, url, depth):
+        self._write({"node": url, "depth": depth})
+
+    def add_links(self, src, links):
+        self._write({"src": src, "dst": sorted(links)})
+        # Flush per page so a crash loses at most the page in flight
+        self.f.flush()
+
+    def close(self):
+        self.f.close()
+
+
+def iter_records(path=GRAPH_FILE):
+    with Path(path).open("r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                # Truncated last line from an interrupted crawl
+                continue
+
+
+def rebuild_structure(path=GRAPH_FILE):
+    # {url: depth} in site_structure.json format, usable even if the crawl died
+    structure = {}
+    for record in iter_records(path):
+        if "node" in record and record["node"] not in structure:
+            structure[record["node"]] = record["depth"]
+    return structure
+
+
+def build_index(path=GRAPH_FILE, index_path=INDEX_FILE):
+    ids = {}
+    nodes = []
+    depths = []
+    out_edges = []
+
+    def node_id(url, depth=None):
+        if url not in ids:
+            ids[url] = len(nodes)
+            nodes.append(url)
+            depths.append(depth)
+            out_edges.append(None)
+        elif depth is not None and depths[ids[url]] is None:
+            depths[ids[url]] = depth
+        return ids[url]
+
+    for record in iter_records(path):
+        if "node" in record:
+            node_id(record["node"], record["depth"])
+        elif "src" in record:
+            src = node_id(record["src"])
+            # Self-links don't count as inbound links
+            out_edges[src] = sorted(set(node_id(dst) for dst in record["dst"] if dst != record["src"]))
+
+    out_offsets, out_targets = [0], []
+    inbound = [[] for _ in nodes]
+    for src, targets in enumerate(out_edges):
+        for dst in targets or []:
+            out_targets.append(dst)
+            inbound[dst].append(src)
+        out_offsets.append(len(out_targets))
+
+    in_offsets, in_sources = [0], []
+    for sources in inbound:
+        in_sources.extend(sources)
+        in_offsets.append(len(in_sources))
+
+    index = {
+        "nodes": nodes,
+        "depth": depths,
+        # Pages whose links were actually read (others were never fetched)
+        "fetched": [i for i, targets in enumerate(out_edges) if targets is not None],
+        "out_offsets": out_offsets,
+        "out_targets": out_targets,
+        "in_offsets": in_offsets,
+        "in_sources": in_sources
+    }
+    with Path(index_path).open("w", encoding="utf-8") as f:
+        json.dump(index, f, separators=(",", ":"), ensure_ascii=False)
+    return LinkGraph(index)
+
+
+class LinkGraph:
+    def __init__(self, index):
+        self.index = index
+        self.ids = {url: i for i, url in enumerate(index["nodes"])}
+
+    @classmethod
+    def load(cls, index_path=INDEX_FILE):
+        with Path(index_path).open("r", encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def _id(self, url):
+        i = self.ids.get(url)
+        return i if i is not None else self.ids.get(normalize_url(url))
+
+    def _slice(self, offsets, values, url):
+        i = self._id(url)
+        if i is None:
+            return []
+        nodes = self.index["nodes"]
+        return [nodes[j] for j in values[offsets[i]:offsets[i + 1]]]
+
+    def outbound(self, url):
+        return self._slice(self.index["out_offsets"], self.index["out_targets"], url)
+
+    def inbound(self, url):
+        return self._slice(self.index["in_offsets"], self.index["in_sources"], url)
+
+    def inbound_count(self, url):
+        i = self._id(url)
+        if i is None:
+            return 0
+        return self.index["in_offsets"][i + 1] - self.index["in_offsets"][i]
+
+    def orphans(self, known_urls=None):
+        # Pages nothing links to. Every page the crawl found was reached by
+        # a link, so this is only useful with known_urls (sitemap or
+        # site_state entries, in their own form): those the crawl never
+        # reached or that have no inbound link. Without it, only pages whose
+        # linking page's links were never written (an interrupted crawl).
+        in_offsets = self.index["in_offsets"]
+        depths = self.index["depth"]
+        if known_urls is None:
+            return sorted(url for i, url in enumerate(self.index["nodes"])
+                          if depths[i] != 0 and in_offsets[i + 1] == in_offsets[i])
+        result = []
+        for url in known_urls:
+            i = self._id(url)
+            if i is None or (depths[i] != 0 and in_offsets[i + 1] == in_offsets[i]):
+                result.append(url)
+        return sorted(set(result))
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "index"
+    if command == "index":
+        graph = build_index()
+        print(f"Indexed {len(graph.index['nodes'])} pages, {len(graph.index['out_targets'])} links -> {INDEX_FILE}")
+    elif command == "structure":
+        import smart_monitor
+        structure = rebuild_structure()
+        smart_monitor.save_json(Path("site_structure.json"), structure)
+        print(f"Rebuilt site_structure.json with {len(structure)} pages from {GRAPH_FILE}")
+    elif command == "inbound":
+        for url in LinkGraph.load().inbound(sys.argv[2]):
+            print(url)
+    elif command == "orphans":
+        # Monitored pages (site_state.json, else the sitemap) no crawled page links to
+        import smart_monitor
+        known = list(smart_monitor.load_json(smart_monitor.STATE_FILE, {}))
+        if not known:
+            known = [smart_monitor.normalize_url(u) for u in smart_monitor.fetch_sitemap_urls(smart_monitor.SITEMAP_URL)]
+        for url in LinkGraph.load().orphans(known):
+            print(url)
+    else:
+        print("Usage: python link_graph.py [index | structure | inbound <url> | orphans]")
@@ -1,39 +1,33 @@
-import requests
-import hashlib
-import json
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from datetime import datetime
 
+import page_cache
+import smart_monitor
+
 STATE_FILE = Path("site_state.json")
 STRUCTURE_FILE = Path("site_structure.json")
 
 def get_content_hash(url):
-    try:
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
-        }
-        response = requests.get(url, timeout=10, headers=headers)
-        if response.status_code == 200:
-            content = response.text
-            return hashlib.sha256(content.encode('utf-8')).hexdigest()
-    except Exception as e:
-        print(f"Error fetching {url}: {e}")
+    # Whole-document hash, read through the shared page cache
+    info = smart_monitor.get_page_info(url, max_age=page_cache.DEFAULT_TTL)
+    if info["status"] == "success":
+        return info["raw_hash"]
     return None
 
 def monitor():
-    if not STRUCTURE_FILE.exists():
+    # Through smart_monitor's loaders, which also read the delta store (state/)
+    if not smart_monitor.data_exists(STRUCTURE_FILE):
         print("Structure file not found. Please run crawler first.")
         return None
 
-    with STRUCTURE_FILE.open("r", encoding="utf-8") as f:
-        structure = json.load(f)
+    structure = smart_monitor.read_json(STRUCTURE_FILE)
 
     # structure is a dict of {url: depth}
     urls = sorted(structure.keys())
 
-    if STATE_FILE.exists():
-        with STATE_FILE.open("r", encoding="utf-8") as f:
-            old_state = json.load(f)
+    if smart_monitor.data_exists(STATE_FILE):
+        old_state = smart_monitor.read_json(STATE_FILE)
     else:
         old_state = {}
 
@@ -41,9 +35,11 @@ def monitor():
     changes = []
 
     print(f"Monitoring {len(urls)} URLs...")
-    for url in urls:
+    with ThreadPoolExecutor(max_workers=10) as executor:
+        hashes = list(executor.map(get_content_hash, urls))
+
+    for url, current_hash in zip(urls, hashes):
         print(f"Checking {url}...")
-        current_hash = get_content_hash(url)
         if current_hash:
             new_state[url] = {
                 "hash": current_hash,
@@ -60,8 +56,7 @@ def monitor():
             if url in old_state:
                 changes.append(f"FAILED: {url}")
 
-    with STATE_FILE.open("w", encoding="utf-8") as f:
-        json.dump(new_state, f, indent=4, ensure_ascii=False)
+    smart_monitor.save_json(STATE_FILE, new_state)
 
     if changes:
         print("\n--- Changes Detected ---")
@@ -3,13 +3,27 @@ import http.server
 import socketserver
 import json
 import os
+import sys
 import webbrowser
 import threading
+from collections import OrderedDict
 from pathlib import Path
+from urllib.parse import urlparse, parse_qs
 
 # Import logic
 import smart_monitor
 import cleanup
+import delta_store
+import fetch_queue
+import fetch_stats
+import history_series
+import scan_lock
+import scan_metrics
+import scheduler
+import search_index
+import snapshots
+import url_events
+import wp_feed
 
 PORT = 8080
 DIRECTORY = os.path.dirname(os.path.abspath(__file__))
@@ -18,19 +32,29 @@ class MonitorAPIHandler(http.server.SimpleHTTPRequestHandler):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, directory=DIRECTORY, **kwargs)
 
+    # Parsed JSON files, reused until the file changes on disk
+    json_cache = {}
+
     def do_GET(self):
-        if self.path == '/api/data':
-            self.send_response(200)
-            self.send_header('Content-Type', 'application/json')
-            self.end_headers()
-            
-            data = {
-                "meta": self.load_json("site_report_meta.json"),
-                "summary": self.load_json("site_summary.json"),
-                "structure": self.load_json("site_structure.json"),
-                "history": self.load_json("monitoring_history.json")
-            }
-            self.wfile.write(json.dumps(data).encode('utf-8'))
+        parsed = urlparse(self.path)
+        query = parse_qs(parsed.query)
+
+        if parsed.path == '/api/data':
+            self.send_json(self.build_data(query.get('since', [None])[0]))
+        elif parsed.path == '/api/cleanup':
+            self.send_json(cleanup_job)
+        elif parsed.path == '/api/fetch-stats':
+            self.send_json(self.build_fetch_stats(query.get('top', [None])[0]))
+        elif parsed.path == '/api/history-series':
+            self.send_json(self.build_history_series(query))
+        elif parsed.path == '/api/url-timeline':
+            self.send_url_timeline(query.get('url', [None])[0])
+        elif parsed.path == '/api/diff':
+            self.send_diff(query)
+        elif parsed.path == '/api/search':
+            self.send_search(query)
+        elif parsed.path == '/metrics':
+            self.send_metrics()
         else:
             # Serve index.html by default
             if self.path == '/' or self.path == '':
@@ -40,27 +64,31 @@ class MonitorAPIHandler(http.server.SimpleHTTPRequestHandler):
     def do_POST(self):
         content_length = int(self.headers['Content-Length']) if 'Content-Length' in self.headers else 0
         
-        if self.path == '/api/scan':
+        parsed = urlparse(self.path)
+        query = parse_qs(parsed.query)
+
+        if parsed.path == '/api/scan':
             try:
-                print("🚀 Starting Scan via API...")
-                smart_monitor.run_targeted_monitor()
-                self.send_success()
+                # ?profile=1 profiles this one run (pstats + allocations in profiles/)
+                profile = query.get('profile', ['0'])[0] in ('1', 'true')
+                print("🚀 Starting Scan via API..." + (" (profiling)" if profile else ""))
+                smart_monitor.run_targeted_monitor(profile=profile)
+                if profile:
+                    history = self.load_json("monitoring_history.json")
+                    self.send_json({"status": "success", "profile": history[-1].get("profile") if history else None})
+                else:
+                    self.send_success()
             except Exception as e:
                 self.send_error_msg(str(e))
         
-        elif self.path == '/api/cleanup':
-            try:
-                cleanup.run_cleanup()
-                self.send_success()
-            except Exception as e:
-                self.send_error_msg(str(e))
+        elif parsed.path == '/api/cleanup':
+            # Runs in the background; progress and the report via GET /api/cleanup
+            start_cleanup_job()
+            self.send_json(cleanup_job, status=202)
                 
-        elif self.path == '/api/reset':
+        elif parsed.path == '/api/reset':
             try:
-                files = ["site_state.json", "site_summary.json", "site_report_meta.json", "monitoring_history.json", "site_structure.json", "site_state_daily.json"]
-                for f in files:
-                    p = Path(DIRECTORY) / f
-                    if p.exists(): p.unlink()
+                scan_lock.run_single_flight(reset_data)
                 self.send_success()
             except Exception as e:
                 self.send_error_msg(str(e))
@@ -71,6 +99,165 @@ class MonitorAPIHandler(http.server.SimpleHTTPRequestHandler):
         self.end_headers()
         self.wfile.write(json.dumps({"status": "success"}).encode())
 
+    def send_json(self, data, status=200):
+        body = json.dumps(data).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Cache-Control', 'no-store')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_metrics(self):
+        # Prometheus scrape target: the scan running in this process (live)
+        # and the breakdown the last finished scan saved to the meta file
+        live = scan_metrics.current
+        meta = self.load_json("site_report_meta.json")
+        body = scan_metrics.render_prometheus(live.snapshot() if live else None, meta.get("metrics"), meta).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Cache-Control', 'no-store')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_url_timeline(self, url):
+        # When a page appeared, disappeared or changed: one lookup in the
+        # event index (parsed once per scan by load_json)
+        if not url:
+            self.send_json({"error": "url required"}, status=400)
+            return
+        index = self.load_json(url_events.EVENTS_FILE.name)
+        events = url_events.timeline(index, url)
+        if not events:
+            url = smart_monitor.normalize_url(url)
+            events = url_events.timeline(index, url)
+        self.send_json({"url": url, "monitored": url in self.load_json("site_structure.json"), "events": events})
+
+    def send_diff(self, query):
+        # Text diff of a page between today's baseline and the current state
+        # (?url=), or between two content hashes (?old=&new=). Computed on
+        # first request and kept in diff_cache.
+        url = query.get('url', [None])[0]
+        old_hash, new_hash = query.get('old', [None])[0], query.get('new', [None])[0]
+        if url:
+            old_hash = old_hash or self.load_json("site_state_daily.json").get(url, {}).get("hash")
+            new_hash = new_hash or self.load_json("site_state.json").get(url, {}).get("hash")
+        if not old_hash or not new_hash:
+            self.send_json({"error": "unknown url or hash"}, status=404)
+            return
+        if old_hash == new_hash:
+            self.send_json({"url": url, "old_hash": old_hash, "new_hash": new_hash, "unchanged": True})
+            return
+
+        key = (old_hash, new_hash)
+        result = diff_cache.get(key)
+        cached = result is not None
+        if not cached:
+            result = snapshots.diff(old_hash, new_hash)
+            if result is None:
+                self.send_json({"error": "snapshot not available", "old_hash": old_hash, "new_hash": new_hash}, status=404)
+                return
+            diff_cache.put(key, result, sum(len(line) for line in result["lines"]))
+        self.send_json({"url": url, "cached": cached, **result})
+
+    def send_search(self, query):
+        # Pages whose title or description contains ?q=, best match first,
+        # ?page= (1-based) of ?per_page= results
+        q = (query.get('q', [''])[0] or '').strip()
+        if not q:
+            self.send_json({"error": "q required"}, status=400)
+            return
+        try:
+            page = int(query.get('page', ['1'])[0])
+            per_page = int(query.get('per_page', [str(search_index.PER_PAGE)])[0])
+        except ValueError:
+            self.send_json({"error": "page and per_page must be integers"}, status=400)
+            return
+        if not search_index.count():
+            # Index from before this feature (or reset): build it once from the state
+            search_index.sync(self.load_json("site_state.json"))
+        result = search_index.search(q, page, per_page)
+        status = {row.get("url"): row.get("status") for row in self.load_json("site_summary.json")}
+        for row in result["results"]:
+            row["status"] = status.get(row["url"])
+        self.send_json(result)
+
+    def build_history_series(self, query):
+        # Chart series downsampled to ?width= points (LTTB), optionally for
+        # a ?from=&to= range of ISO timestamps
+        metric = query.get('metric', ['total_count'])[0]
+        if metric not in history_series.METRICS:
+            metric = 'total_count'
+        try:
+            width = int(query.get('width', ['500'])[0])
+        except ValueError:
+            width = 500
+        return history_series.query(self.load_json("monitoring_history.json"),
+                                    self.load_json(history_series.SERIES_FILE.name),
+                                    metric, width, query.get('from', [None])[0], query.get('to', [None])[0])
+
+    def build_fetch_stats(self, top=None):
+        # Latency percentiles and slowest/largest pages from the rolling window
+        stats = self.load_json(fetch_stats.STATS_FILE.name)
+        summary = stats.get("summary") or {}
+        try:
+            top = int(top) if top else None
+        except ValueError:
+            top = None
+        if top and top != fetch_stats.TOP_N:
+            summary = fetch_stats.report(stats.get("urls", {}), top=max(1, min(top, 500)))
+        return {"updated": stats.get("updated"), "window": stats.get("window"), **summary}
+
+    def build_data(self, since=None):
+        meta = self.load_json("site_report_meta.json")
+        seq = meta.get("seq", 0)
+        cursor = f"{meta.get('sync_epoch', '0')}.{seq}"
+
+        if since == cursor:
+            return {"cursor": cursor, "delta": True, "unchanged": True}
+
+        # A cursor is usable only if it comes from the same data set and the
+        # change journal still covers every scan after it
+        since_seq = None
+        if since and since.rsplit('.', 1)[0] == str(meta.get('sync_epoch', '0')):
+            try: since_seq = int(since.rsplit('.', 1)[1])
+            except (IndexError, ValueError): pass
+
+        changes = self.load_json("site_changes.json")
+        journal = [c for c in changes if since_seq is not None and c.get("seq", 0) > since_seq]
+        if since_seq is None or since_seq > seq or len(journal) != seq - since_seq:
+            return {
+                "cursor": cursor,
+                "delta": False,
+                "meta": meta,
+                "summary": self.load_json("site_summary.json"),
+                "structure": self.load_json("site_structure.json"),
+                "history": self.load_json("monitoring_history.json")
+            }
+
+        summary = self.load_json("site_summary.json")
+        structure = self.load_json("site_structure.json")
+        summary_urls = set(row.get("url") for row in summary)
+
+        summary_removed = set()
+        structure_touched = set()
+        for entry in journal:
+            summary_removed.update(entry.get("summary_removed", []))
+            structure_touched.update(entry.get("structure_added", []))
+            structure_touched.update(entry.get("structure_removed", []))
+
+        return {
+            "cursor": cursor,
+            "delta": True,
+            "meta": meta,
+            "summary": [row for row in summary if row.get("seq", 0) > since_seq],
+            "summary_removed": sorted(summary_removed - summary_urls),
+            "structure": {url: structure[url] for url in structure_touched if url in structure},
+            "structure_removed": sorted(url for url in structure_touched if url not in structure),
+            "history": [h for h in self.load_json("monitoring_history.json") if h.get("seq", 0) > since_seq]
+        }
+
     def send_error_msg(self, msg):
         self.send_response(500)
         self.end_headers()
@@ -78,11 +265,96 @@ class MonitorAPIHandler(http.server.SimpleHTTPRequestHandler):
 
     def load_json(self, filename):
         p = Path(DIRECTORY) / filename
-        if p.exists():
-            with p.open('r', encoding='utf-8') as f:
-                try: return json.load(f)
-                except: return [] if "history" in filename or "summary" in filename else {}
-        return [] if "history" in filename or "summary" in filename else {}
+        empty = [] if "history" in filename or "summary" in filename or "changes" in filename else {}
+        delta_dir = Path(DIRECTORY) / delta_store.DELTA_DIR
+        if filename in delta_store.FILES and delta_store.exists(filename, delta_dir):
+            # Base snapshot plus delta patches, rebuilt once per change
+            key = ("delta",) + delta_store.signature(filename, delta_dir)
+            cached = self.json_cache.get(filename)
+            if cached and cached[0] == key:
+                return cached[1]
+            data = delta_store.load(filename, empty, delta_dir)
+            self.json_cache[filename] = (key, data)
+            return data
+        try:
+            stat = p.stat()
+        except OSError:
+            return empty
+
+        # Callers must treat the returned data as read-only
+        key = (stat.st_mtime_ns, stat.st_size)
+        cached = self.json_cache.get(filename)
+        if cached and cached[0] == key:
+            return cached[1]
+
+        with p.open('r', encoding='utf-8') as f:
+            try: data = json.load(f)
+            except: return empty
+        self.json_cache[filename] = (key, data)
+        return data
+
+class DiffCache:
+    # LRU of computed diffs keyed by (old hash, new hash), bounded by the
+    # total length of the cached diff lines
+    def __init__(self, max_chars):
+        self.max_chars = max_chars
+        self.entries = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            self.entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, key, value, size):
+        with self.lock:
+            if key in self.entries:
+                self.size -= self.entries.pop(key)[1]
+            self.entries[key] = (value, size)
+            self.size += size
+            while self.size > self.max_chars and len(self.entries) > 1:
+                self.size -= self.entries.popitem(last=False)[1][1]
+
+diff_cache = DiffCache(max_chars=8 * 1024 * 1024)
+
+# Last cleanup run: status is idle, running, done or error
+cleanup_job = {"status": "idle", "report": None, "error": None}
+# Two requests at once must not both see "not running" and start a job
+cleanup_job_lock = threading.Lock()
+
+def start_cleanup_job():
+    global cleanup_job
+    with cleanup_job_lock:
+        if cleanup_job["status"] == "running":
+            return
+        cleanup_job = {"status": "running", "report": None, "error": None}
+
+    def run():
+        global cleanup_job
+        try:
+            cleanup_job = {"status": "done", "report": cleanup.run_cleanup(), "error": None}
+        except Exception as e:
+            cleanup_job = {"status": "error", "report": None, "error": str(e)}
+
+    threading.Thread(target=run, name="cleanup", daemon=True).start()
+
+def reset_data():
+    files = ["site_state.json", "site_summary.json", "site_report_meta.json", "monitoring_history.json", "site_structure.json", "site_state_daily.json", "site_changes.json", fetch_stats.STATS_FILE.name, fetch_queue.QUEUE_FILE.name, history_series.SERIES_FILE.name, wp_feed.FEED_FILE.name, url_events.EVENTS_FILE.name]
+    for f in files:
+        p = Path(DIRECTORY) / f
+        if p.exists(): p.unlink()
+        if f in delta_store.FILES:
+            delta_store.remove(f, Path(DIRECTORY) / delta_store.DELTA_DIR)
+    # Empty the search index along with the state it was built from
+    search_index.sync({})
+
+class MonitorServer(socketserver.ThreadingTCPServer):
+    # Request threads don't keep the process alive on shutdown
+    daemon_threads = True
 
 def start_browser():
     webbrowser.open(f"http://localhost:{PORT}")
@@ -92,8 +364,14 @@ if __name__ == "__main__":
     
     # Auto-open browser
     threading.Timer(1.5, start_browser).start()
+
+    # Optional tiered scan scheduler (python monitor_server.py --scheduler)
+    if "--scheduler" in sys.argv or os.environ.get("MONITOR_SCHEDULER") == "1":
+        scheduler.TieredScheduler().start()
     
-    with socketserver.TCPServer(("", PORT), MonitorAPIHandler) as httpd:
+    # Threaded so dashboards keep polling during a scan; duplicate scan
+    # requests attach to the running one through scan_lock
+    with MonitorServer(("", PORT), MonitorAPIHandler) as httpd:
         try:
             httpd.serve_forever()
         except KeyboardInterrupt:
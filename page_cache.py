@@ -0,0 +1,100 @@
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from urllib.parse import urlparse, urlunparse
+
+# Page metadata (title, description, hashes) shared by smart_monitor,
+# summarizer and monitor so the same page isn't downloaded three times
+CACHE_FILE = Path(".page_cache.sqlite")
+
+# Entries younger than this are served without any network request
+DEFAULT_TTL = 6 * 60 * 60
+# Least recently used entries beyond this are evicted
+MAX_ENTRIES = 50000
+
+_local = threading.local()
+
+
+def cache_key(url):
+    # Same page regardless of query string, fragment or trailing slash
+    parsed = urlparse(url)
+    return urlunparse((parsed.scheme, parsed.netloc.lower(), parsed.path, '', '', '')).rstrip('/')
+
+
+def _db():
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = sqlite3.connect(str(CACHE_FILE), timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("""CREATE TABLE IF NOT EXISTS pages (
+            key TEXT PRIMARY KEY,
+            etag TEXT,
+            last_modified TEXT,
+            info TEXT NOT NULL,
+            fetched_at REAL NOT NULL,
+            accessed_at REAL NOT NULL)""")
+        conn.execute("CREATE INDEX IF NOT EXISTS pages_accessed ON pages (accessed_at)")
+        _local.conn = conn
+    return conn
+
+
+def get(url, max_age=DEFAULT_TTL):
+    # Cached info if fetched within max_age seconds, else None
+    try:
+        conn = _db()
+        row = conn.execute("SELECT info, fetched_at FROM pages WHERE key = ?", (cache_key(url),)).fetchone()
+        if not row or time.time() - row[1] > max_age:
+            return None
+        with conn:
+            conn.execute("UPDATE pages SET accessed_at = ? WHERE key = ?", (time.time(), cache_key(url)))
+        return json.loads(row[0])
+    except sqlite3.Error as e:
+        print(f"⚠️ Page cache read failed: {e}")
+        return None
+
+
+def validators(url):
+    # (info, etag, last_modified) for a conditional request, regardless of age
+    try:
+        row = _db().execute("SELECT info, etag, last_modified FROM pages WHERE key = ?", (cache_key(url),)).fetchone()
+        if row:
+            return json.loads(row[0]), row[1], row[2]
+    except sqlite3.Error as e:
+        print(f"⚠️ Page cache read failed: {e}")
+    return None, None, None
+
+
+def put(url, info, etag=None, last_modified=None):
+    now = time.time()
+    try:
+        conn = _db()
+        with conn:
+            conn.execute("INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?)",
+                         (cache_key(url), etag, last_modified, json.dumps(info, ensure_ascii=False), now, now))
+    except sqlite3.Error as e:
+        print(f"⚠️ Page cache write failed: {e}")
+
+
+def revalidated(url):
+    # Server answered 304: the cached entry is fresh again
+    now = time.time()
+    try:
+        conn = _db()
+        with conn:
+            conn.execute("UPDATE pages SET fetched_at = ?, accessed_at = ? WHERE key = ?", (now, now, cache_key(url)))
+    except sqlite3.Error as e:
+        print(f"⚠️ Page cache write failed: {e}")
+
+
+def evict(max_entries=MAX_ENTRIES):
+    try:
+        conn = _db()
+        with conn:
+            cur = conn.execute("""DELETE FROM pages WHERE key IN (
+                SELECT key FROM pages ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)""", (max_entries,))
+        return cur.rowcount
+    except sqlite3.Error as e:
+        print(f"⚠️ Page cache eviction failed: {e}")
+        return 0
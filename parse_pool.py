@@ -0,0 +1,45 @@
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+# Worker processes for the CPU-bound half of a scan (HTML parsing and
+# hashing), fed by the fetch threads. Parsing in the fetch threads
+# serializes on the GIL; here it scales with the number of cores while the
+# threads keep downloading.
+
+
+class ParsePool:
+    # At most `backlog` calls are queued or running at once. A fetch thread
+    # with a body in hand waits for a slot, so when parsing falls behind the
+    # downloads slow down instead of piling bodies up in memory.
+    def __init__(self, processes, backlog=None):
+        # spawn: forking a process that has live sockets, sqlite connections
+        # and fetch threads isn't safe
+        self.executor = ProcessPoolExecutor(processes, mp_context=multiprocessing.get_context("spawn"))
+        self.processes = processes
+        self.backlog = backlog or processes * 2
+        self.slots = threading.BoundedSemaphore(self.backlog)
+        self.broken = False
+
+    def call(self, func, *args):
+        # func(*args) in a worker process; in the calling thread if the
+        # pool has died (e.g. a worker was killed)
+        if not self.broken:
+            with self.slots:
+                try:
+                    return self.executor.submit(func, *args).result()
+                except BrokenProcessPool:
+                    if not self.broken:
+                        self.broken = True
+                        print("⚠️ Parse worker pool broke; parsing in fetch threads from here on")
+        return func(*args)
+
+    def close(self):
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
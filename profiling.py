@@ -0,0 +1,126 @@
+import cProfile
+import io
+import pstats
+import sys
+import threading
+import tracemalloc
+from pathlib import Path
+
+# One-off scan profiling (smart_monitor.py --profile, POST /api/scan?profile=1).
+# Only imported when profiling is requested, so normal scans pay nothing.
+PROFILE_DIR = Path("profiles")
+TRACE_FRAMES = 10
+TOP_N = 25
+
+# Coarse buckets for "where did the time go", matched against
+# "<file>:<function>" of each profiled function (first match wins)
+CATEGORIES = [
+    ("parse", ("/bs4/", "/html/parser", "_markupbase", "/soupsieve/")),
+    ("regex", ("/re/", "/re.py", "/sre_", "re.Pattern", "_sre")),
+    ("json", ("/json/", "_json")),
+    ("hashing", ("hashlib",)),
+    ("sqlite", ("sqlite3",)),
+    ("network", ("/requests/", "/urllib3/", "socket", "ssl", "/http/client")),
+    ("waiting", ("acquire", "SimpleQueue", "/threading.py:wait")),
+]
+
+
+class Profiler:
+    # cProfile for the calling thread and every thread started while it runs
+    # (the fetch pools), plus tracemalloc for allocations
+    def __init__(self):
+        self.main = cProfile.Profile()
+        self.threads = []
+        self.lock = threading.Lock()
+        self.snapshot = None
+        self.peak = 0
+
+    def _thread_hook(self, frame, event, arg):
+        sys.setprofile(None)
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Python 3.12+: the main profiler already sees every thread
+            return
+        with self.lock:
+            self.threads.append(profile)
+
+    def start(self):
+        tracemalloc.start(TRACE_FRAMES)
+        threading.setprofile(self._thread_hook)
+        self.main.enable()
+
+    def stop(self):
+        self.main.disable()
+        threading.setprofile(None)
+        self.snapshot = tracemalloc.take_snapshot()
+        self.peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    def stats(self):
+        stats = pstats.Stats(self.main)
+        for profile in self.threads:
+            stats.add(profile)
+        return stats
+
+    def save(self, name, directory=PROFILE_DIR):
+        # Writes <name>.pstats (load with `python -m pstats`) and
+        # <name>.alloc.txt; returns a summary for the history entry
+        directory = Path(directory)
+        directory.mkdir(exist_ok=True)
+        stats = self.stats()
+        pstats_path = directory / f"{name}.pstats"
+        stats.dump_stats(str(pstats_path))
+
+        alloc_path = directory / f"{name}.alloc.txt"
+        top_allocs = self.snapshot.statistics("lineno")[:TOP_N]
+        with alloc_path.open("w", encoding="utf-8") as f:
+            f.write(f"Peak traced memory: {self.peak / 1024 / 1024:.1f} MB\n\n")
+            for stat in top_allocs:
+                f.write(f"{stat.size / 1024:10.1f} KiB  {stat.count:8d} blocks  {stat.traceback[0]}\n")
+            f.write("\nTop allocation tracebacks:\n")
+            for stat in self.snapshot.statistics("traceback")[:5]:
+                f.write(f"\n{stat.size / 1024:.1f} KiB in {stat.count} blocks\n")
+                f.write("\n".join(stat.traceback.format()) + "\n")
+
+        return {
+            "pstats": pstats_path.as_posix(),
+            "allocations": alloc_path.as_posix(),
+            "peak_traced_mb": round(self.peak / 1024 / 1024, 1),
+            "categories": categorize(stats),
+            "top_functions": top_functions(stats),
+            "top_allocations": [{"where": str(stat.traceback[0]), "kib": round(stat.size / 1024, 1), "blocks": stat.count}
+                                for stat in top_allocs[:10]]
+        }
+
+
+def _label(func):
+    filename, line, name = func
+    return f"{filename.replace(chr(92), '/')}:{name}" if filename != "~" else name
+
+
+def categorize(stats):
+    # Own time (tottime) per category, summed over threads
+    totals = {}
+    for func, (cc, nc, tt, ct, callers) in stats.stats.items():
+        label = _label(func)
+        category = next((c for c, needles in CATEGORIES if any(n in label for n in needles)), "other")
+        totals[category] = totals.get(category, 0.0) + tt
+    return {k: round(v, 3) for k, v in sorted(totals.items(), key=lambda kv: -kv[1])}
+
+
+def top_functions(stats, limit=TOP_N):
+    rows = sorted(stats.stats.items(), key=lambda kv: -kv[1][2])[:limit]
+    return [{"function": f"{_label(func)}:{func[1]}", "calls": nc, "tottime": round(tt, 3), "cumtime": round(ct, 3)}
+            for func, (cc, nc, tt, ct, callers) in rows]
+
+
+def format_summary(summary):
+    out = io.StringIO()
+    out.write(f"🔬 Profile saved: {summary['pstats']}, {summary['allocations']} (peak {summary['peak_traced_mb']} MB)\n")
+    out.write("   Time by category (thread seconds): " +
+              ", ".join(f"{k} {v:.2f}s" for k, v in summary["categories"].items()) + "\n")
+    for row in summary["top_functions"][:10]:
+        out.write(f"   {row['tottime']:8.3f}s  {row['calls']:8d}  {row['function']}\n")
+    return out.getvalue()
@@ -0,0 +1,74 @@
+import math
+from datetime import datetime, timedelta
+
+# Revisit interval bounds (hours)
+MIN_REVISIT_HOURS = 1
+MAX_REVISIT_HOURS = 30 * 24
+
+# Global cap on priority URLs re-fetched per run (new URLs are always fetched)
+MAX_FETCHES_PER_RUN = 300
+
+
+def estimate_change_rate(comparisons, changes, span_days):
+    # Poisson change rate (changes/day) from n checks at mean interval I that
+    # saw X changes, after Cho & Garcia-Molina: r = -ln((n - X + 0.5) / (n + 1)) / I.
+    # The n + 1 keeps a small positive rate for pages never seen changing.
+    if comparisons <= 0 or span_days <= 0:
+        return None
+    interval = span_days / comparisons
+    return -math.log((comparisons - changes + 0.5) / (comparisons + 1)) / interval
+
+
+def update_entry(prev, new_hash, now_iso, changed=None):
+    # Returns the revisit fields for a page that was just fetched successfully.
+    # changed overrides the whole-hash comparison (e.g. block-level detection
+    # that ignores template regions).
+    now = datetime.fromisoformat(now_iso)
+    prev = prev or {}
+    first_checked = prev.get("first_checked") or prev.get("last_checked") or now_iso
+    checks = prev.get("checks", 1 if prev.get("hash") else 0) + 1
+    if changed is None:
+        changed = bool(prev.get("hash")) and prev.get("hash") != new_hash
+    changes = prev.get("changes", 0) + (1 if changed else 0)
+    streak = 0 if changed else prev.get("unchanged_streak", 0) + 1
+
+    comparisons = checks - 1
+    span_days = (now - datetime.fromisoformat(first_checked)).total_seconds() / 86400
+    rate = estimate_change_rate(comparisons, changes, span_days)
+
+    # Every unchanged check in a row doubles the interval and any change
+    # resets it; the learned rate caps how far out a page can drift
+    hours = MIN_REVISIT_HOURS * 2 ** min(streak, 20)
+    if rate:
+        hours = min(hours, 24 / rate)
+    hours = min(max(hours, MIN_REVISIT_HOURS), MAX_REVISIT_HOURS)
+
+    return {
+        "first_checked": first_checked,
+        "checks": checks,
+        "changes": changes,
+        "unchanged_streak": streak,
+        "change_rate": round(rate, 4) if rate is not None else None,
+        "revisit_hours": round(hours, 1),
+        "next_visit": (now + timedelta(hours=hours)).isoformat()
+    }
+
+
+def select_due(urls, state, now_iso, budget=MAX_FETCHES_PER_RUN):
+    # Pick the priority URLs whose revisit time has come, most overdue first
+    # (relative to their own interval), up to the per-run fetch budget
+    now = datetime.fromisoformat(now_iso)
+    due = []
+    for url in urls:
+        entry = state.get(url, {})
+        next_visit = entry.get("next_visit")
+        if not next_visit:
+            due.append((float("inf"), url))
+            continue
+        lateness = (now - datetime.fromisoformat(next_visit)).total_seconds() / 3600
+        if lateness >= 0:
+            due.append((lateness / max(entry.get("revisit_hours", MIN_REVISIT_HOURS), MIN_REVISIT_HOURS), url))
+
+    due.sort(key=lambda d: (-d[0], d[1]))
+    selected = [url for _, url in due[:budget]] if budget is not None else [url for _, url in due]
+    return selected, len(due) - len(selected)
@@ -0,0 +1,119 @@
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+# Shared by every process that writes the monitoring JSON files
+# (monitor_server, a manual smart_monitor.py run, cleanup)
+LOCK_FILE = Path(".scan.lock")
+STATUS_FILE = Path(".scan_status.json")
+
+# Job currently running in this process; duplicate requests attach to it
+_inflight = None
+_inflight_guard = threading.Lock()
+
+
+class _Job:
+    def __init__(self, key):
+        self.key = key
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+def _try_lock(f):
+    try:
+        if fcntl:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+        return True
+    except OSError:
+        return False
+
+
+def _unlock(f):
+    if fcntl:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+    else:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def _write_status(status):
+    tmp = STATUS_FILE.with_name(STATUS_FILE.name + ".tmp")
+    with tmp.open("w", encoding="utf-8") as f:
+        json.dump(status, f, ensure_ascii=False)
+    os.replace(tmp, STATUS_FILE)
+
+
+def read_status():
+    try:
+        with STATUS_FILE.open("r", encoding="utf-8") as f:
+            return json.load(f)
+    except: return {}
+
+
+def _run_locked(key, fn, args, kwargs):
+    with LOCK_FILE.open("a+") as f:
+        if not _try_lock(f):
+            holder = read_status()
+            print(f"🔒 Scan already running (pid {holder.get('pid', '?')}, since {holder.get('started', '?')}). Waiting for it...")
+            while not _try_lock(f):
+                time.sleep(1)
+            finished = read_status()
+            # Another process just did the same work: reuse its outcome instead of fetching again
+            if finished.get("key") == key and "result" in finished:
+                _unlock(f)
+                print("🔗 Attached to the scan that just finished in another process.")
+                return finished["result"]
+
+        try:
+            _write_status({"key": key, "pid": os.getpid(), "started": datetime.now().isoformat()})
+            result = fn(*args, **kwargs)
+            _write_status({"key": key, "pid": os.getpid(), "finished": datetime.now().isoformat(),
+                           "result": result if isinstance(result, (bool, int, float, str, type(None))) else None})
+            return result
+        finally:
+            _unlock(f)
+
+
+def run_single_flight(fn, *args, **kwargs):
+    global _inflight
+    key = f"{fn.__name__}{args!r}{sorted(kwargs.items())!r}"
+
+    while True:
+        with _inflight_guard:
+            job = _inflight
+            if job is None:
+                job = _inflight = _Job(key)
+                break
+        if job.key == key:
+            print("🔗 Same job already running in this process. Attaching to it...")
+            job.done.wait()
+            if job.error:
+                raise job.error
+            return job.result
+        # A different job holds the slot; run ours once it is done
+        job.done.wait()
+
+    try:
+        job.result = _run_locked(key, fn, args, kwargs)
+        return job.result
+    except BaseException as e:
+        job.error = e
+        raise
+    finally:
+        with _inflight_guard:
+            _inflight = None
+        job.done.set()
+
@@ -0,0 +1,137 @@
+import threading
+import time
+
+# Phase timings and counters for the scan running in this process.
+# smart_monitor records into `current`; the finished snapshot lands in
+# site_report_meta.json and the history entry, and monitor_server serves
+# both (live and last run) at /metrics.
+PHASES = ("baseline", "sitemap", "verify", "fetch", "diff", "write")
+COUNTERS = ("requests", "bytes_downloaded", "pages_parsed", "cache_hits", "not_modified", "probes")
+
+current = None
+_guard = threading.Lock()
+
+
+class ScanMetrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.phases = {}
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        # Parsing runs inside the fetch threads, so it is summed per page
+        # (thread seconds) rather than timed as a phase of its own
+        self.parse_seconds = 0.0
+        self.errors = {}
+        self.active = None
+        self.active_since = None
+
+    def begin(self, phase):
+        # Ends the active phase (if any) and starts the next
+        now = time.perf_counter()
+        with self.lock:
+            if self.active:
+                self.phases[self.active] = self.phases.get(self.active, 0.0) + now - self.active_since
+            self.active, self.active_since = phase, now
+
+    def end(self):
+        self.begin(None)
+
+    def incr(self, name, amount=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def add_parse_time(self, seconds):
+        with self.lock:
+            self.parse_seconds += seconds
+
+    def error(self, kind):
+        with self.lock:
+            self.errors[kind] = self.errors.get(kind, 0) + 1
+
+    def snapshot(self):
+        with self.lock:
+            phases = dict(self.phases)
+            if self.active:
+                phases[self.active] = phases.get(self.active, 0.0) + time.perf_counter() - self.active_since
+            return {
+                "duration": round(time.time() - self.started, 3),
+                "phases": {k: round(v, 3) for k, v in phases.items()},
+                "parse_seconds": round(self.parse_seconds, 3),
+                "counters": dict(self.counters),
+                "errors": dict(self.errors),
+                "active_phase": self.active
+            }
+
+
+def start():
+    global current
+    with _guard:
+        current = ScanMetrics()
+        return current
+
+
+def finish():
+    global current
+    with _guard:
+        current = None
+
+
+# No-ops when no scan is running (summarizer/monitor reuse get_page_info)
+def incr(name, amount=1):
+    metrics = current
+    if metrics:
+        metrics.incr(name, amount)
+
+
+def error(kind):
+    metrics = current
+    if metrics:
+        metrics.error(kind)
+
+
+def add_parse_time(seconds):
+    metrics = current
+    if metrics:
+        metrics.add_parse_time(seconds)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def render_prometheus(live, last, meta=None):
+    # Prometheus text exposition format. live/last are snapshot() dicts
+    # (None when absent); run="live" is the scan in progress in this process.
+    lines = []
+
+    def metric(name, kind, help_text, samples):
+        lines.append(f"# HELP sp_monitor_{name} {help_text}")
+        lines.append(f"# TYPE sp_monitor_{name} {kind}")
+        for labels, value in samples:
+            label_text = ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items())
+            lines.append(f"sp_monitor_{name}{{{label_text}}} {value}" if label_text else f"sp_monitor_{name} {value}")
+
+    runs = [(run, snap) for run, snap in (("live", live), ("last", last)) if snap]
+    metric("scan_running", "gauge", "1 while a scan is in progress in this server process.", [({}, 1 if live else 0)])
+    metric("scan_duration_seconds", "gauge", "Wall-clock duration of the scan.",
+           [({"run": run}, snap.get("duration", 0)) for run, snap in runs])
+    metric("phase_seconds", "gauge", "Wall-clock seconds spent in each scan phase.",
+           [({"run": run, "phase": phase}, seconds) for run, snap in runs for phase, seconds in snap.get("phases", {}).items()])
+    metric("parse_seconds", "gauge", "HTML parse and hash time summed over fetch threads.",
+           [({"run": run}, snap.get("parse_seconds", 0)) for run, snap in runs])
+    for name in COUNTERS:
+        metric(name, "gauge", f"Scan counter: {name.replace('_', ' ')}.",
+               [({"run": run}, snap.get("counters", {}).get(name, 0)) for run, snap in runs])
+    metric("errors", "gauge", "Fetch and probe errors by type.",
+           [({"run": run, "type": kind}, count) for run, snap in runs for kind, count in sorted(snap.get("errors", {}).items())])
+
+    if meta:
+        try:
+            finished = time.mktime(time.strptime(meta.get("curr_time", "").split(".")[0], "%Y-%m-%dT%H:%M:%S"))
+            metric("last_scan_timestamp_seconds", "gauge", "Unix time the last scan started.", [({}, int(finished))])
+        except ValueError:
+            pass
+        metric("pages", "gauge", "Pages in the monitored state after the last scan.", [({}, meta.get("curr_count", 0))])
+        metric("pages_checked", "gauge", "Pages fetched by the last scan.", [({}, meta.get("total_checked", 0))])
+        metric("pages_deferred", "gauge", "Due pages left for a later scan by the fetch budget.", [({}, meta.get("deferred_count", 0))])
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,105 @@
+import random
+import threading
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import smart_monitor
+
+SCHEDULE_FILE = Path("scheduler_state.json")
+
+# Scan tiers, each on its own cadence (seconds). sections=None is a full
+# sitemap scan; jitter spreads runs so they don't hit the site on the hour.
+TIERS = [
+    {"name": "news", "sections": ["/news"], "interval": 60 * 60, "jitter": 5 * 60},
+    {"name": "blog", "sections": ["/blog", "/corporate-blog"], "interval": 3 * 60 * 60, "jitter": 15 * 60},
+    {"name": "daily", "sections": None, "interval": 24 * 60 * 60, "jitter": 30 * 60},
+]
+
+TICK_SECONDS = 30
+# Tiers coming due within this window ride along with the current batch
+MERGE_WINDOW = timedelta(minutes=10)
+
+
+class TieredScheduler:
+    def __init__(self, tiers=None, tick=TICK_SECONDS):
+        self.tiers = tiers or TIERS
+        self.tick = tick
+        self.stop_event = threading.Event()
+        self.next_due = self.load_state()
+
+    def load_state(self):
+        saved = smart_monitor.load_json(SCHEDULE_FILE, {})
+        now = datetime.now()
+        next_due = {}
+        for tier in self.tiers:
+            try:
+                next_due[tier["name"]] = datetime.fromisoformat(saved[tier["name"]])
+            except (KeyError, TypeError, ValueError):
+                # Unknown tier: run soon, spread by its jitter
+                next_due[tier["name"]] = now + timedelta(seconds=random.uniform(0, tier["jitter"]))
+        return next_due
+
+    def save_state(self):
+        smart_monitor.save_json(SCHEDULE_FILE, {name: due.isoformat() for name, due in self.next_due.items()})
+
+    def reschedule(self, tier, now):
+        offset = tier["interval"] + random.uniform(-tier["jitter"], tier["jitter"])
+        self.next_due[tier["name"]] = now + timedelta(seconds=max(offset, self.tick))
+
+    def due_batch(self, now):
+        due = [t for t in self.tiers if self.next_due[t["name"]] <= now]
+        if not due:
+            return [], None
+        due += [t for t in self.tiers if t not in due and self.next_due[t["name"]] <= now + MERGE_WINDOW]
+
+        if any(t["sections"] is None for t in due):
+            return due, None
+        return due, sorted(set(path for t in due for path in t["sections"]))
+
+    @staticmethod
+    def covers(sections, tier):
+        if sections is None:
+            return True
+        return tier["sections"] is not None and set(tier["sections"]) <= set(sections)
+
+    def run_pending(self):
+        now = datetime.now()
+        due, sections = self.due_batch(now)
+        if not due:
+            return False
+
+        print(f"⏰ Scheduled scan: {', '.join(t['name'] for t in due)} ({'full' if sections is None else ', '.join(sections)})")
+        try:
+            smart_monitor.run_targeted_monitor(sections=sections)
+        except Exception as e:
+            print(f"⚠️ Scheduled scan failed: {e}")
+
+        # Any tier whose sections were just scanned is fresh again
+        finished = datetime.now()
+        for tier in self.tiers:
+            if tier in due or self.covers(sections, tier):
+                self.reschedule(tier, finished)
+        self.save_state()
+        return True
+
+    def run_forever(self):
+        print(f"🗓️ Scheduler started: {', '.join(t['name'] for t in self.tiers)}")
+        while not self.stop_event.is_set():
+            self.run_pending()
+            self.stop_event.wait(self.tick)
+
+    def start(self):
+        thread = threading.Thread(target=self.run_forever, name="scan-scheduler", daemon=True)
+        thread.start()
+        return thread
+
+    def stop(self):
+        self.stop_event.set()
+
+
+if __name__ == "__main__":
+    scheduler = TieredScheduler()
+    try:
+        scheduler.run_forever()
+    except KeyboardInterrupt:
+        print("\n🛑 Scheduler stopped.")
@@ -0,0 +1,221 @@
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import defaultdict
+from pathlib import Path
+
+import snapshots
+
+# Full-text search over page titles and descriptions (and, opt-in, page
+# text) for GET /api/search. Japanese has no spaces between words, so the
+# index is over character bigrams instead of words: a query matches a page
+# when every bigram of the query occurs in it, ranked by BM25 with title
+# hits weighted above description and body hits. Each scan re-tokenizes
+# only the pages whose indexed fields changed.
+INDEX_FILE = Path(".search_index.sqlite")
+# Page text makes the index much larger; MONITOR_SEARCH_BODY=1 turns it on
+INDEX_BODY = os.environ.get("MONITOR_SEARCH_BODY") == "1"
+FIELDS = ("title", "description", "body")
+FIELD_WEIGHTS = (3.0, 1.0, 0.5)
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+# Score multiplier for pages whose title contains the query as typed
+# (spacing aside: Japanese queries are often split where titles are not)
+PHRASE_BOOST = 2.0
+PER_PAGE = 20
+MAX_PER_PAGE = 100
+
+_WORD = re.compile(r"\w+")
+# Highest code point, for prefix ranges over the gram column
+_MAX_CHAR = "\U0010ffff"
+# URLs per docs lookup (SQLite caps the number of bound parameters)
+_BATCH = 500
+
+_local = threading.local()
+
+
+def _db():
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = sqlite3.connect(str(INDEX_FILE), timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("""CREATE TABLE IF NOT EXISTS docs (
+            url TEXT PRIMARY KEY,
+            title TEXT NOT NULL,
+            description TEXT NOT NULL,
+            hash TEXT,
+            title_len INTEGER NOT NULL,
+            description_len INTEGER NOT NULL,
+            body_len INTEGER NOT NULL)""")
+        conn.execute("""CREATE TABLE IF NOT EXISTS postings (
+            gram TEXT NOT NULL,
+            field INTEGER NOT NULL,
+            url TEXT NOT NULL,
+            tf INTEGER NOT NULL,
+            PRIMARY KEY (gram, field, url)) WITHOUT ROWID""")
+        conn.execute("CREATE INDEX IF NOT EXISTS postings_url ON postings (url)")
+        # Corpus statistics for BM25 (document count, summed field lengths),
+        # kept up to date by sync so a query reads no more than it matched
+        conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        if conn.execute("SELECT 1 FROM meta LIMIT 1").fetchone() is None:
+            # New index, or one built before the statistics were kept
+            with conn:
+                conn.execute("INSERT OR IGNORE INTO meta SELECT 'documents', COUNT(*) FROM docs")
+                for field in FIELDS:
+                    conn.execute(f"INSERT OR IGNORE INTO meta SELECT '{field}_len', COALESCE(SUM({field}_len), 0) FROM docs")
+        _local.conn = conn
+    return conn
+
+
+def _stats(conn):
+    # (document count, [summed length per field])
+    meta = dict(conn.execute("SELECT key, value FROM meta"))
+    return meta.get("documents", 0), [meta.get(f"{field}_len", 0) for field in FIELDS]
+
+
+def _adjust(conn, lengths, sign):
+    # Adds (sign=1) or removes (sign=-1) one document's field lengths
+    conn.execute("UPDATE meta SET value = value + ? WHERE key = 'documents'", (sign,))
+    conn.executemany("UPDATE meta SET value = value + ? WHERE key = ?",
+                     ((sign * n, f"{field}_len") for field, n in zip(FIELDS, lengths)))
+
+
+def _lengths(conn, url):
+    return conn.execute("SELECT title_len, description_len, body_len FROM docs WHERE url = ?", (url,)).fetchone()
+
+
+def normalize(text):
+    # NFKC folds full/half-width forms (ＡＢＣ, ｶﾀｶﾅ) together
+    return unicodedata.normalize("NFKC", text or "").lower()
+
+
+def grams(text):
+    # {gram: count}: the bigrams of every run of word characters, plus each
+    # run's last character on its own so one-character queries can match
+    # by prefix (a character is either the start of a bigram or a run's end)
+    counts = defaultdict(int)
+    for run in _WORD.findall(normalize(text)):
+        for i in range(len(run) - 1):
+            counts[run[i:i + 2]] += 1
+        counts[run[-1]] += 1
+    return counts
+
+
+def _query_terms(query):
+    # [(gram, is_prefix)]; a one-character run matches any gram starting with it
+    terms = []
+    for run in _WORD.findall(normalize(query)):
+        if len(run) == 1:
+            terms.append((run, True))
+        else:
+            terms.extend((run[i:i + 2], False) for i in range(len(run) - 1))
+    return list(dict.fromkeys(terms))
+
+
+def _index_page(conn, url, entry, body):
+    field_grams = [grams(entry.get("title")), grams(entry.get("description"))]
+    text = snapshots.get(entry.get("hash")) if body and entry.get("hash") else None
+    field_grams.append(grams(text) if text else {})
+    lengths = [sum(counts.values()) for counts in field_grams]
+    old = _lengths(conn, url)
+    if old:
+        _adjust(conn, old, -1)
+    _adjust(conn, lengths, 1)
+    conn.execute("DELETE FROM postings WHERE url = ?", (url,))
+    conn.executemany("INSERT INTO postings VALUES (?, ?, ?, ?)",
+                     ((gram, field, url, tf) for field, counts in enumerate(field_grams) for gram, tf in counts.items()))
+    conn.execute("INSERT OR REPLACE INTO docs VALUES (?, ?, ?, ?, ?, ?, ?)",
+                 (url, entry.get("title") or "", entry.get("description") or "", entry.get("hash") if body else None,
+                  *lengths))
+
+
+def sync(pages, body=INDEX_BODY):
+    # Brings the index in line with {url: state entry}: pages whose title,
+    # description (or with body, content hash) changed are re-tokenized,
+    # pages no longer present are dropped
+    try:
+        conn = _db()
+        known = {row[0]: tuple(row[1:]) for row in conn.execute("SELECT url, title, description, hash FROM docs")}
+        indexed, removed = 0, 0
+        with conn:
+            for url in known.keys() - pages.keys():
+                _adjust(conn, _lengths(conn, url), -1)
+                conn.execute("DELETE FROM postings WHERE url = ?", (url,))
+                conn.execute("DELETE FROM docs WHERE url = ?", (url,))
+                removed += 1
+            for url, entry in pages.items():
+                current = (entry.get("title") or "", entry.get("description") or "", entry.get("hash") if body else None)
+                if known.get(url) == current:
+                    continue
+                _index_page(conn, url, entry, body)
+                indexed += 1
+        return {"indexed": indexed, "removed": removed, "documents": len(pages)}
+    except sqlite3.Error as e:
+        print(f"⚠️ Search index update failed: {e}")
+        return None
+
+
+def count():
+    try:
+        return _stats(_db())[0]
+    except sqlite3.Error:
+        return 0
+
+
+def search(query, page=1, per_page=PER_PAGE):
+    # Ranked page `page` (1-based) of the pages matching every query gram
+    started = time.perf_counter()
+    page = max(1, int(page))
+    per_page = max(1, min(int(per_page), MAX_PER_PAGE))
+    result = {"query": query, "total": 0, "page": page, "per_page": per_page, "results": []}
+    terms = _query_terms(query)
+    if terms:
+        conn = _db()
+        n_docs, total_lens = _stats(conn)
+        avg_lens = [total / n_docs if n_docs else 0 for total in total_lens]
+        # Postings of every term, narrowed to the pages matching all so far
+        postings = []
+        matched = None
+        for gram, prefix in terms:
+            if prefix:
+                rows = conn.execute("SELECT field, url, tf FROM postings WHERE gram >= ? AND gram < ?",
+                                    (gram, gram + _MAX_CHAR)).fetchall()
+            else:
+                rows = conn.execute("SELECT field, url, tf FROM postings WHERE gram = ?", (gram,)).fetchall()
+            urls = set(row[1] for row in rows)
+            matched = urls if matched is None else matched & urls
+            if not matched:
+                break
+            postings.append((math.log(1 + (n_docs - len(urls) + 0.5) / (len(urls) + 0.5)), rows))
+        if matched:
+            docs = {}
+            ordered = sorted(matched)
+            for start in range(0, len(ordered), _BATCH):
+                batch = ordered[start:start + _BATCH]
+                docs.update((row[0], row[1:]) for row in conn.execute(
+                    "SELECT url, title, description, title_len, description_len, body_len FROM docs WHERE url IN (%s)"
+                    % ",".join("?" * len(batch)), batch))
+            scores = defaultdict(float)
+            for idf, rows in postings:
+                for field, url, tf in rows:
+                    if url not in docs:
+                        continue
+                    norm = 1 - B + B * docs[url][2 + field] / (avg_lens[field] or 1)
+                    scores[url] += FIELD_WEIGHTS[field] * idf * tf * (K1 + 1) / (tf + K1 * norm)
+            phrase = "".join(normalize(query).split())
+            ranked = []
+            for url, doc in docs.items():
+                title, description = doc[:2]
+                score = scores[url] * (PHRASE_BOOST if phrase in "".join(normalize(title).split()) else 1)
+                ranked.append((-score, url, title, description))
+            ranked.sort()
+            result["total"] = len(ranked)
+            result["results"] = [{"url": url, "title": title, "description": description, "score": round(-score, 4)}
+                                 for score, url, title, description in ranked[(page - 1) * per_page:page * per_page]]
+    result["took_ms"] = round((time.perf_counter() - started) * 1000, 2)
+    return result
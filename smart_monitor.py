@@ -3,11 +3,32 @@ from bs4 import BeautifulSoup
 import json
 import hashlib
 from datetime import datetime
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
+from functools import partial
+import os
 import re
+import time
 from urllib.parse import urljoin, urlparse, urlunparse
 from pathlib import Path
 
+import block_hash
+import delta_store
+import fetch_queue
+import fetch_stats
+import fingerprint
+import history_series
+import http_archive
+import page_cache
+import parse_pool
+import revisit
+import scan_lock
+import scan_metrics
+import search_index
+import snapshots
+import url_events
+import wp_feed
+from bloom import BloomFilter
+
 # Files
 STRUCTURE_FILE = Path("site_structure.json")
 STATE_FILE = Path("site_state.json")
@@ -15,11 +36,87 @@ DAILY_STATE_FILE = Path("site_state_daily.json")
 SUMMARY_FILE = Path("site_summary.json")
 REPORT_META_FILE = Path("site_report_meta.json")
 HISTORY_FILE = Path("monitoring_history.json")
+CHANGES_FILE = Path("site_changes.json")
+DISCOVERY_BLOOM_FILE = Path("site_discovery.bloom")
+
+# Near-duplicate clusters kept in the report meta
+DUPLICATE_CLUSTER_LIMIT = 20
+DUPLICATE_CLUSTER_URLS = 50
+
+# Number of scans kept in the change journal used by delta sync (/api/data?since=)
+CHANGE_JOURNAL_LIMIT = 500
 
-SITEMAP_URL = "https://www.splashtop.co.jp/wp-sitemap.xml"
+# Overridable so benchmarks (and staging copies of the site) can be monitored
+SITEMAP_URL = os.environ.get("MONITOR_SITEMAP_URL", "https://www.splashtop.co.jp/wp-sitemap.xml")
 DYNAMIC_PATHS = ['/news', '/achievements', '/products-service', '/knowhow', '/blog', '/corporate-blog']
 NEW_ONLY_PATHS = ['/achievements', '/knowhow']
 
+# Deep discovery (opt-in): links found in pages are probed before entering state
+MAX_DISCOVERY_PROBES = 200
+PROBE_WORKERS = 16
+FETCH_WORKERS = 10
+# Parse worker processes for large scans (0 = parse in the fetch threads);
+# smaller scans don't pay the worker start-up
+PARSE_PROCESSES = int(os.environ.get("MONITOR_PARSE_PROCESSES", max((os.cpu_count() or 1) - 1, 0)))
+PARSE_POOL_MIN_PAGES = 100
+SKIP_EXTENSIONS = ('.pdf', '.zip', '.exe', '.jpg', '.jpeg', '.png', '.gif', '.svg', '.webp', '.mp4', '.xml')
+
+# Every request of a scan (sitemaps, pages, probes) goes through this
+# keep-alive session; http_archive mounts its record/replay adapters on it
+SESSION = requests.Session()
+SESSION.mount("http://", requests.adapters.HTTPAdapter(pool_maxsize=PROBE_WORKERS))
+SESSION.mount("https://", requests.adapters.HTTPAdapter(pool_maxsize=PROBE_WORKERS))
+
+def data_exists(path):
+    # The large files live under state/ once delta persistence is on; a
+    # legacy full file is still read until the first delta save replaces it
+    return (delta_store.handles(path) and delta_store.exists(path)) or path.exists()
+
+def read_json(path):
+    # Like load_json, but an unreadable file raises instead of reading as empty
+    if delta_store.handles(path) and delta_store.exists(path):
+        data = delta_store.load(path)
+        if data is None:
+            raise ValueError(f"unreadable delta store for {path}")
+        return data
+    with path.open("r", encoding="utf-8") as f:
+        return json.load(f)
+
+def load_json(path, default):
+    if data_exists(path):
+        try:
+            return read_json(path)
+        except: pass
+    return default
+
+def save_json(path, data):
+    if delta_store.handles(path):
+        delta_store.save(path, data)
+        if path.exists():
+            path.unlink()
+        return
+    # Write to a temp file and swap it in, so readers never see a torn file
+    tmp = path.with_name(path.name + ".tmp")
+    with tmp.open("w", encoding="utf-8") as f:
+        json.dump(data, f, indent=4, ensure_ascii=False)
+    os.replace(tmp, path)
+
+def stamp_summary_rows(summary_data, old_summary, seq):
+    # Rows keep the sequence number of the scan that last changed them, so
+    # delta sync can send only rows produced after a client's cursor.
+    # last_checked moves on every run and is not treated as a change.
+    old_rows = {row.get("url"): row for row in old_summary if isinstance(row, dict)}
+    for row in summary_data:
+        old = old_rows.get(row["url"])
+        if old is not None:
+            old_cmp = {k: v for k, v in old.items() if k not in ("last_checked", "seq")}
+            new_cmp = {k: v for k, v in row.items() if k not in ("last_checked", "seq")}
+            if old_cmp == new_cmp:
+                row["seq"] = old.get("seq", 0)
+                continue
+        row["seq"] = seq
+    return set(old_rows) - set(row["url"] for row in summary_data)
+
 def fetch_sitemap_urls(url, visited_sitemaps=None):
     if visited_sitemaps is None:
         visited_sitemaps = set()
@@ -32,7 +129,9 @@ def fetch_sitemap_urls(url, visited_sitemaps=None):
     all_urls = []
     try:
         headers = {'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'}
-        response = requests.get(url, timeout=15, headers=headers)
+        response = SESSION.get(url, timeout=15, headers=headers)
+        scan_metrics.incr("requests")
+        scan_metrics.incr("bytes_downloaded", len(response.content))
         if response.status_code == 200:
             content = response.text
             
@@ -60,6 +159,7 @@ def fetch_sitemap_urls(url, visited_sitemaps=None):
                     all_urls.append(u)
                     
     except Exception as e:
+        scan_metrics.error(type(e).__name__)
         print(f"⚠️ Sitemap fetch failed ({url}): {e}")
     
     return list(set(all_urls))
@@ -86,7 +186,13 @@ def should_ignore(url):
 def is_dynamic(url):
     if should_ignore(url):
         return False
-    return any(path in url for path in DYNAMIC_PATHS) or url == "https://www.splashtop.co.jp"
+    return any(path in url for path in DYNAMIC_PATHS) or url == SITEMAP_URL.rsplit('/', 1)[0]
+
+def in_sections(url, sections):
+    # sections=None means a full scan of every dynamic path
+    if sections is None:
+        return True
+    return any(path in url for path in sections)
 
 def is_new_only(url):
     return any(path in url for path in NEW_ONLY_PATHS)
@@ -97,59 +203,322 @@ def normalize_url(url):
     normalized = urlunparse((parsed.scheme, parsed.netloc, parsed.path, '', '', ''))
     return normalized
 
-def get_page_info(url):
+def extract_links(soup, page_url):
+    # Same-host page links that pass the IGNORE_PATTERNS classifier
+    host = urlparse(page_url).netloc
+    links = set()
+    for a in soup.find_all('a', href=True):
+        raw = urljoin(page_url, a['href'])
+        link = normalize_url(raw)
+        parsed = urlparse(link)
+        if parsed.scheme not in ('http', 'https') or parsed.netloc != host:
+            continue
+        if link.lower().endswith(SKIP_EXTENSIONS) or should_ignore(raw) or should_ignore(link):
+            continue
+        links.add(link)
+    return sorted(links)
+
+def parse_page(url, html, discover=False):
+    # CPU-bound half of get_page_info: parse, extract metadata and hash.
+    # Module-level and side-effect free apart from the snapshot store, so
+    # it can run in a parse worker process (fetch_in_order).
+    parse_start = time.perf_counter()
+    soup = BeautifulSoup(html, 'html.parser')
+
+    # Deep discovery is opt-in: links come from the same parse that
+    # hashes the page, and are probed before they can enter state
+    discovered_links = extract_links(soup, url) if discover else []
+
+    title = soup.title.string.strip() if soup.title and soup.title.string else "No Title"
+    if not title: title = "No Title"
+
+    meta_desc = soup.find("meta", {"name": "description"})
+    description = meta_desc["content"].strip() if meta_desc and "content" in meta_desc.attrs else "No Description"
+
+    cleaned_content = soup.get_text()
+    content_hash = hashlib.sha256(cleaned_content.encode('utf-8')).hexdigest()
+    # Text kept by hash so the server can diff versions on demand
+    snapshots.put(content_hash, cleaned_content)
+
+    info = {
+        "url": url,
+        "title": title,
+        "description": description,
+        "hash": content_hash,
+        "raw_hash": hashlib.sha256(html.encode('utf-8')).hexdigest(), # Whole-document hash (monitor.py)
+        "blocks": block_hash.build_tree(soup), # Per-block Merkle tree for localized change detection
+        "minhash": fingerprint.signature(cleaned_content), # Template-change / near-duplicate fingerprint (None without NumPy)
+        "status": "success",
+        "links": discovered_links
+    }
+    return info, time.perf_counter() - parse_start
+
+def get_page_info(url, max_age=0, discover=False, parse=parse_page):
+    # Reads through the shared page cache: an entry younger than max_age
+    # seconds is used as-is (no request); otherwise the cached validators
+    # turn the fetch into a conditional GET. parse is parse_page or a
+    # stand-in that runs it elsewhere (the parse process pool).
+    if max_age:
+        cached = page_cache.get(url, max_age)
+        if cached:
+            scan_metrics.incr("cache_hits")
+            return dict(cached, url=url)
+    # Per-request telemetry (TTFB, total time, bytes, status) for fetch_stats
+    fetch = None
+    request_start = time.perf_counter()
     try:
         headers = {
             'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
         }
-        response = requests.get(url, timeout=12, headers=headers)
+        cached, etag, last_modified = page_cache.validators(url)
+        if cached:
+            if etag: headers['If-None-Match'] = etag
+            if last_modified: headers['If-Modified-Since'] = last_modified
+        response = SESSION.get(url, timeout=12, headers=headers)
+        scan_metrics.incr("requests")
+        fetch = {
+            "ttfb_ms": round(response.elapsed.total_seconds() * 1000, 1),
+            "total_ms": round((time.perf_counter() - request_start) * 1000, 1),
+            "bytes": len(response.content),
+            "status": response.status_code
+        }
+        if response.status_code == 304 and cached:
+            scan_metrics.incr("not_modified")
+            page_cache.revalidated(url)
+            return dict(cached, url=url, fetch=fetch)
+        scan_metrics.incr("bytes_downloaded", len(response.content))
         if response.status_code == 200:
-            soup = BeautifulSoup(response.text, 'html.parser')
-            
-            # --- DEEP DISCOVERY REMOVED ---
-            # We now strictly rely on the Sitemap to avoid broken/garbage URLs found in HTML body.
-            discovered_links = []
-
-            title = soup.title.string.strip() if soup.title else "No Title"
-            if not title: title = "No Title"
-            
-            meta_desc = soup.find("meta", {"name": "description"})
-            description = meta_desc["content"].strip() if meta_desc and "content" in meta_desc.attrs else "No Description"
-            
-            cleaned_content = soup.get_text()
-            content_hash = hashlib.sha256(cleaned_content.encode('utf-8')).hexdigest()
-            
-            return {
-                "url": url, 
-                "title": title,
-                "description": description,
-                "hash": content_hash,
-                "status": "success",
-                "links": [] # No more deep discovery
-            }
-        elif response.status_code == 404:
-            return {"url": url, "status": "404"}
+            info, parse_seconds = parse(url, response.text, discover)
+            scan_metrics.add_parse_time(parse_seconds)
+            scan_metrics.incr("pages_parsed")
+            # Reached through a redirect to the URL's canonical form
+            if normalize_url(response.url) != normalize_url(url):
+                info["canonical_url"] = normalize_url(response.url)
+            page_cache.put(url, info, response.headers.get('ETag'), response.headers.get('Last-Modified'))
+            info["fetch"] = fetch
+            return info
+        scan_metrics.error(f"http_{response.status_code}")
+        if response.status_code == 404:
+            return {"url": url, "status": "404", "fetch": fetch}
     except Exception as e:
+        scan_metrics.error(type(e).__name__)
         print(f"⚠️ Fetch failed for {url}: {e}")
-    return {"url": url, "status": "error"}
+        fetch = {"ttfb_ms": None, "total_ms": round((time.perf_counter() - request_start) * 1000, 1), "bytes": None, "status": None}
+    return {"url": url, "status": "error", "fetch": fetch}
+
+def probe_url(url):
+    # Cheap existence check: HEAD, or a 1-byte ranged GET if HEAD isn't allowed
+    headers = {'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'}
+    scan_metrics.incr("probes")
+    try:
+        response = SESSION.head(url, timeout=8, headers=headers, allow_redirects=False)
+        if response.status_code in (405, 501):
+            response = SESSION.get(url, timeout=8, headers=dict(headers, Range='bytes=0-0'), allow_redirects=False, stream=True)
+            response.close()
+        status = 200 if response.status_code == 206 else response.status_code
+        return {"url": url, "status": status,
+                "content_type": response.headers.get('Content-Type', ''),
+                "location": response.headers.get('Location')}
+    except Exception as e:
+        scan_metrics.error(type(e).__name__)
+        return {"url": url, "status": None, "error": str(e)}
+
+def probe_urls(urls):
+    with ThreadPoolExecutor(max_workers=PROBE_WORKERS) as executor:
+        return {res["url"]: res for res in executor.map(probe_url, urls)}
+
+def page_changes(old, new):
+    # Changed content blocks between two state entries / page infos. Block
+    # trees ignore template regions; entries saved before block hashing (or
+    # with an older block layout) fall back to the whole-text hash.
+    if old.get("blocks") and new.get("blocks") and old["blocks"].get("v") == new["blocks"].get("v"):
+        return block_hash.changed_blocks(old["blocks"], new["blocks"])
+    if old.get("hash") and new.get("hash") and old["hash"] != new["hash"]:
+        return ["page"]
+    return []
+
+def same_resource(url, target):
+    # A redirect that only canonicalizes the URL (scheme, www., trailing
+    # slash) rather than sending it to another page
+    def key(u):
+        parsed = urlparse(u)
+        host = parsed.netloc.lower()
+        return host[4:] if host.startswith("www.") else host, parsed.path.rstrip("/")
+    return key(url) == key(target)
+
+def is_gone(probe):
+    # 404/410, or a redirect to another page (a different path, the home
+    # page): the URL itself is not a live page. A redirect to its own
+    # canonical form is followed by the full fetch, which drops it if the
+    # target turns out to be a 404.
+    status = probe.get("status") if probe else None
+    if status in (404, 410):
+        return True
+    if status is not None and 300 <= status < 400:
+        location = probe.get("location")
+        return not location or not same_resource(probe["url"], urljoin(probe["url"], location))
+    return False
+
+def describe_deletion(probe):
+    # (verified, description) for a URL that left the sitemap
+    status = probe.get("status") if probe else None
+    if status in (404, 410):
+        return "gone", f"Removed from site ({status})."
+    if status is not None and 300 <= status < 400:
+        return "redirect", f"No longer in sitemap. Redirects to {probe.get('location') or 'another page'}."
+    if status == 200:
+        return "alive", "No longer in sitemap, but the page still responds (200)."
+    return "unknown", "No longer in sitemap."
+
+def transient_failure(status):
+    # No response, rate limiting or a server error: worth retrying next run
+    return status is None or status == 429 or status >= 500
+
+def discover_new_pages(results, known_urls):
+    # Links seen in fetched pages -> not already known -> not probed before
+    # (Bloom seen-set) -> alive HTML page (HEAD probe) -> full fetch. A link
+    # enters the seen-set once it is accepted or rejected for good, so one
+    # that failed on the network is tried again next run.
+    bloom = BloomFilter.load(DISCOVERY_BLOOM_FILE)
+    known = set(u.rstrip('/') for u in known_urls)
+    candidates = []
+    for res in results:
+        for link in res.get("links", []):
+            if link.rstrip('/') in known or link in bloom:
+                continue
+            known.add(link.rstrip('/'))
+            candidates.append(link)
+    if not candidates:
+        return []
+
+    candidates = candidates[:MAX_DISCOVERY_PROBES]
+    print(f"🕵️ Deep Discovery: probing {len(candidates)} unlisted links...")
+    alive = []
+    for url, probe in probe_urls(candidates).items():
+        if transient_failure(probe["status"]):
+            continue
+        if probe["status"] == 200 and "html" in probe["content_type"]:
+            alive.append(url)
+        elif 300 <= probe["status"] < 400 and not is_gone(probe):
+            alive.append(url)  # Redirects to its canonical form
+        else:
+            bloom.add(url)
+
+    with ThreadPoolExecutor(max_workers=10) as executor:
+        infos = list(executor.map(get_page_info, alive))
+    found = []
+    for info in infos:
+        if info["status"] != "success" and transient_failure((info.get("fetch") or {}).get("status")):
+            continue
+        bloom.add(info["url"])
+        if info["status"] == "success" and not (info.get("canonical_url") and not same_resource(info["url"], info["canonical_url"])):
+            found.append(info)
+    bloom.save(DISCOVERY_BLOOM_FILE)
+    return found
+
+def fetch_in_order(urls, deadline=None, discover=False, parse_processes=None):
+    # Fetches urls in the given order, keeping only a few requests queued
+    # ahead of the workers so nothing new starts once the deadline (a
+    # time.monotonic() value) has passed. Returns (results, unfetched urls).
+    # Large scans parse in worker processes; the fetch threads hand bodies
+    # over and wait, which throttles downloads to the parsing rate.
+    processes = PARSE_PROCESSES if parse_processes is None else parse_processes
+    if processes > 0 and len(urls) >= PARSE_POOL_MIN_PAGES:
+        with parse_pool.ParsePool(processes) as pool:
+            print(f"⚙️ Parsing in {processes} worker processes")
+            # Enough threads to keep downloading while a full backlog parses
+            return _fetch_in_order(urls, deadline, discover, partial(pool.call, parse_page), FETCH_WORKERS + pool.backlog)
+    return _fetch_in_order(urls, deadline, discover, parse_page, FETCH_WORKERS)
+
+def _fetch_in_order(urls, deadline, discover, parse, workers):
+    results = []
+    in_flight = set()
+    submitted = 0
+
+    def collect(done):
+        for future in done:
+            results.append(future.result())
+            if len(results) % 20 == 0:
+                print(f"📊 Progress: {len(results)}/{len(urls)} tasks finished.")
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for url in urls:
+            if deadline is not None and time.monotonic() >= deadline:
+                break
+            if len(in_flight) >= workers * 2:
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                collect(done)
+            in_flight.add(executor.submit(get_page_info, url, 0, discover, parse))
+            submitted += 1
+        collect(as_completed(in_flight))
+    print(f"📊 Progress: {len(results)}/{len(urls)} tasks finished.")
+    return results, urls[submitted:]
+
+def run_targeted_monitor(sections=None, force=False, fetch_budget=revisit.MAX_FETCHES_PER_RUN, deep_discovery=False, profile=False, time_budget=None):
+    # Single-flight: concurrent requests (API, manual run, scheduler) share one scan
+    if sections is not None:
+        sections = sorted(set(sections))
+    return scan_lock.run_single_flight(_run_targeted_monitor, sections=sections, force=force,
+                                       fetch_budget=fetch_budget, deep_discovery=deep_discovery, profile=profile,
+                                       time_budget=time_budget)
+
+def _run_targeted_monitor(profile=False, **kwargs):
+    metrics = scan_metrics.start()
+    profiler = None
+    if profile:
+        # Imported on demand: without --profile nothing is hooked or traced
+        import profiling
+        profiler = profiling.Profiler()
+        profiler.start()
+    result = False
+    try:
+        # The profiler only sees this process, so a profiled scan parses
+        # in its fetch threads where the parse time can be attributed
+        result = _scan(metrics, parse_processes=0 if profiler else None, **kwargs)
+        return result
+    finally:
+        if profiler:
+            profiler.stop()
+            save_profile(profiler, attach=bool(result))
+        scan_metrics.finish()
+
+def save_profile(profiler, attach=True):
+    # Files are named after the scan's seq and linked from its history entry
+    import profiling
+    meta = load_json(REPORT_META_FILE, {})
+    seq = meta.get("seq", 0) if attach else "aborted"
+    summary = profiler.save(f"scan-{seq}-{datetime.now().strftime('%Y%m%d%H%M%S')}")
+    print(profiling.format_summary(summary))
+    if attach:
+        history = load_json(HISTORY_FILE, [])
+        for entry in reversed(history):
+            if entry.get("seq") == seq:
+                entry["profile"] = summary
+                save_json(HISTORY_FILE, history)
+                break
+    return summary
+
+def _scan(metrics, sections=None, force=False, fetch_budget=revisit.MAX_FETCHES_PER_RUN, deep_discovery=False, time_budget=None,
+          parse_processes=None):
+    # time_budget (seconds, whole scan): once used up no new page fetch
+    # starts; unfetched URLs are carried over to the next run
+    deadline = time.monotonic() + time_budget if time_budget else None
 
-def run_targeted_monitor():
     # 1. Initialize Daily Baseline Stability
+    metrics.begin("baseline")
     today_str = datetime.now().strftime("%Y-%m-%d")
     current_run_time = datetime.now().isoformat()
     
     # Load Master State (The most recent known state)
-    if STATE_FILE.exists():
-        with STATE_FILE.open("r", encoding="utf-8") as f:
-            master_state = json.load(f)
+    if data_exists(STATE_FILE):
+        master_state = read_json(STATE_FILE)
     else:
         master_state = {}
 
     # Load Daily Baseline (Used to calculate the report diff for "Today")
-    if not DAILY_STATE_FILE.exists():
+    if not data_exists(DAILY_STATE_FILE):
         # First time ever run or manually deleted
-        with DAILY_STATE_FILE.open("w", encoding="utf-8") as f:
-            json.dump(master_state, f, indent=4, ensure_ascii=False)
+        save_json(DAILY_STATE_FILE, master_state)
         baseline_state = master_state
         last_report_date = today_str # Set to today to avoid re-triggering baseline update in this run
     else:
@@ -164,15 +533,14 @@ def run_targeted_monitor():
         
         if last_report_date != today_str:
             print(f"📆 New Day Detected ({today_str}). Rotating daily baseline...")
-            with DAILY_STATE_FILE.open("w", encoding="utf-8") as f:
-                json.dump(master_state, f, indent=4, ensure_ascii=False)
+            save_json(DAILY_STATE_FILE, master_state)
             baseline_state = master_state
         else:
             print(f"📆 Same Day Run. Comparing against today's initial baseline.")
-            with DAILY_STATE_FILE.open("r", encoding="utf-8") as f:
-                baseline_state = json.load(f)
+            baseline_state = read_json(DAILY_STATE_FILE)
 
     # 2. XML Differential Discovery
+    metrics.begin("sitemap")
     sitemap_urls = fetch_sitemap_urls(SITEMAP_URL)
     if not sitemap_urls:
         print("❌ Could not fetch sitemap. Aborting.")
@@ -180,6 +548,8 @@ def run_targeted_monitor():
 
     # Normalize sitemap URLs
     sitemap_set = set(normalize_url(u) for u in sitemap_urls if not should_ignore(u))
+    # Pages found by deep discovery aren't in the sitemap but stay monitored
+    sitemap_set |= set(u for u, v in master_state.items() if v.get("source") == "discovery")
     master_set = set(master_state.keys())
     baseline_set = set(baseline_state.keys())
 
@@ -188,61 +558,131 @@ def run_targeted_monitor():
     deleted_urls_since_baseline = baseline_set - sitemap_set
     stable_urls = sitemap_set & baseline_set
 
+    # Verification: concurrent HEAD probes confirm deletions and screen
+    # candidate-new URLs, so ghost pages (404/410/redirect elsewhere) never
+    # cost a full GET. On the very first run every URL needs metadata, so
+    # skip screening.
+    metrics.begin("verify")
+    probe_targets = set(deleted_urls_since_baseline)
+    if baseline_state:
+        probe_targets |= new_urls_since_baseline
+    probes = probe_urls(sorted(probe_targets)) if probe_targets else {}
+    ghost_urls = set(u for u in new_urls_since_baseline if is_gone(probes.get(u)))
+    new_to_fetch = new_urls_since_baseline - ghost_urls
+    if probes:
+        print(f"🩺 Verified {len(probes)} new/deleted URLs with HEAD probes ({len(ghost_urls)} ghost new URLs skipped).")
+
     # Determine which URLs to actually FETCH
     # We fetch:
     # - New URLs (to get title/description)
-    # - Priority URLs (to check for content modifications)
-    priority_urls = [u for u in stable_urls if is_dynamic(u)]
-    urls_to_fetch = sorted(list(new_urls_since_baseline | set(priority_urls)))
+    # - Priority URLs (to check for content modifications), limited to the
+    #   requested sections for a tiered (partial) scan
+    priority_urls = [u for u in stable_urls if is_dynamic(u) and in_sections(u, sections)]
+
+    # URLs an earlier budget-limited run didn't get to are fetched regardless
+    # of their revisit time (those outside this scan's sections keep waiting)
+    carried = [u for u in fetch_queue.load() if u in sitemap_set]
+    carried_due = set(u for u in carried if u in stable_urls and in_sections(u, sections))
+
+    # WordPress REST change feed: pages it lists as modified since we saw
+    # them are fetched; pages it covers but doesn't list haven't changed and
+    # skip the HTML revisit. Everything else (and every page, when the API
+    # is unavailable) stays on the revisit schedule below.
+    feed_modified, feed_due, feed_skipped = None, set(), set()
+    feed_meta = {"source": "html"}
+    if wp_feed.ENABLED and not force:
+        feed = wp_feed.load()
+        listing, feed_requests = wp_feed.changed_since(SESSION, wp_feed.api_base(SITEMAP_URL), feed.get("cursor"),
+                                                       headers={'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'})
+        scan_metrics.incr("requests", feed_requests)
+        if listing is not None:
+            feed_modified = {normalize_url(link): modified for link, modified in listing.items()}
+            feed_due = set(u for u in priority_urls if u in feed_modified and wp_feed.is_newer(feed_modified[u], master_state.get(u, {})))
+            feed_skipped = set(u for u in priority_urls if master_state.get(u, {}).get("wp_modified") or u in feed_modified) - feed_due - carried_due
+            feed_meta = {"source": "wp-rest", "requests": feed_requests, "listed": len(feed_modified),
+                         "due": len(feed_due), "skipped": len(feed_skipped)}
+            print(f"📰 WordPress REST feed: {len(feed_modified)} modified since last run, "
+                  f"{len(feed_due)} to fetch, {len(feed_skipped)} unchanged pages skipped ({feed_requests} requests).")
+        else:
+            print("📰 WordPress REST feed unavailable; using HTML revisits only.")
+
+    # Adaptive revisits: only priority URLs whose learned revisit time has
+    # come are fetched, within the per-run budget (new URLs always count first)
+    deferred_count = 0
+    known_due = carried_due | feed_due
+    if force:
+        due_priority = priority_urls
+    else:
+        budget = None if fetch_budget is None else max(fetch_budget - len(new_to_fetch) - len(known_due), 0)
+        candidates = [u for u in priority_urls if u not in known_due and u not in feed_skipped]
+        due_priority, deferred_count = revisit.select_due(candidates, master_state, current_run_time, budget)
+        print(f"⏳ Revisit schedule: {len(due_priority)} due, {len(carried_due)} carried over, "
+              f"{len(candidates) - len(due_priority) - deferred_count} not due yet, {deferred_count} over budget.")
+    # Most valuable first, so a run cut short by the time budget has
+    # covered new pages and volatile sections
+    urls_to_fetch = fetch_queue.order(new_to_fetch | set(due_priority) | known_due, new_to_fetch, set(carried) | feed_due, master_state)
     
+    if sections is not None:
+        print(f"🎯 Section scan: {', '.join(sections)}")
     print(f"📊 Sitemap Stats: {len(sitemap_set)} URLs found.")
     print(f"🔎 Scanning {len(urls_to_fetch)} priority/new URLs for changes...")
 
     # 3. Concurrent Content Fetching
-    results = []
-    with ThreadPoolExecutor(max_workers=10) as executor:
-        future_to_url = {executor.submit(get_page_info, url): url for url in urls_to_fetch}
-        completed = 0
-        for future in as_completed(future_to_url):
-            completed += 1
-            info = future.result()
-            results.append(info)
-            if completed % 20 == 0 or completed == len(urls_to_fetch):
-                print(f"📊 Progress: {completed}/{len(urls_to_fetch)} tasks finished.")
+    metrics.begin("fetch")
+    results, unfetched = fetch_in_order(urls_to_fetch, deadline, deep_discovery, parse_processes)
+    if unfetched:
+        print(f"⌛ Time budget used up: {len(unfetched)} URLs carried over to the next run.")
+    queued = set(urls_to_fetch)
+    carry_over = unfetched + [u for u in carried if u not in queued]
+    if feed_modified:
+        # The cursor moves past changes outside this section scan; queue them
+        pending = set(carry_over) | queued
+        carry_over += sorted(u for u in feed_modified if u in stable_urls and is_dynamic(u) and u not in pending
+                             and wp_feed.is_newer(feed_modified[u], master_state.get(u, {})))
 
     url_to_info = {res["url"]: res for res in results}
     
     # --- DEEP SYNC: Merge links found in HTML with our sitemap list ---
     final_url_set = sitemap_set.copy()
-    for res in results:
-        if "links" in res:
-            for link in res["links"]:
-                if link not in final_url_set:
-                    print(f"🕵️ Deep Discovery Found: {link}")
-                    final_url_set.add(link)
-                    # For these newly found links, we'll mark them as 'new'
-                    # and they will be processed in the next run's fetch list.
+    if deep_discovery:
+        for info in discover_new_pages(results, final_url_set | baseline_set | master_set):
+            print(f"🕵️ Deep Discovery Found: {info['url']}")
+            url_to_info[info["url"]] = info
+            final_url_set.add(info["url"])
 
     # 4. Generate Summary and Update States
+    metrics.begin("diff")
     summary_data = []
     new_master_state = master_state.copy()
+    # Content changes since each page's previous fetch (not the daily
+    # baseline), for the per-URL event index
+    content_changes = {}
     
     # Process all URLs in the final merged set
     for url in final_url_set:
         status = "stable"
+        changed = []
         info = url_to_info.get(url)
         
         # If this is a NEW url and we couldn't fetch it, DISCARD it (it's a ghost URL)
         # Stricter: Also discard if it returns success but has neither title nor description (common for garbage pages)
         is_success = info and info["status"] == "success"
         has_content = info and (info.get("title") != "No Title" or info.get("description") != "No Description")
-        
-        if url not in baseline_state and (not is_success or not has_content):
+        # Not fetched this run (time budget) but already fetched by an earlier run today
+        kept_from_master = info is None and url in master_state and url not in ghost_urls
+
+        # A new URL whose fetch followed redirects onto another page
+        moved_away = is_success and info.get("canonical_url") and not same_resource(url, info["canonical_url"])
+
+        if url not in baseline_state and (not is_success or not has_content or moved_away) and not kept_from_master:
             if url in new_master_state: del new_master_state[url]
             continue
 
         # If it was in baseline but 404'd today, it's effectively deleted
         if url in baseline_state and info and info["status"] == "404":
+            # Discovered pages have no sitemap entry to drop them, so do it here
+            if master_state.get(url, {}).get("source") == "discovery":
+                new_master_state.pop(url, None)
             continue
 
         # Detect Status based on Baseline
@@ -251,43 +691,100 @@ def run_targeted_monitor():
             print(f"🆕 NEW: {url}")
         elif url in priority_urls and info and info["status"] == "success":
             # Check for modification against baseline
-            old_hash = baseline_state.get(url, {}).get("hash")
-            if old_hash and info["hash"] != old_hash:
+            changed = page_changes(baseline_state.get(url, {}), info)
+            if changed:
                 if not is_new_only(url):
                     status = "changed"
-                    print(f"📝 CHANGED: {url}")
+                    print(f"📝 CHANGED: {url} ({', '.join(changed)})")
+        elif url in stable_urls and is_dynamic(url) and not (info and info["status"] == "success"):
+            # Not fetched this run (other section or failed fetch): keep any
+            # change an earlier run today already recorded in master state
+            changed = page_changes(baseline_state.get(url, {}), master_state.get(url, {}))
+            if changed and not is_new_only(url):
+                status = "changed"
         
         # Determine metadata to display
         if info and info["status"] == "success":
+            since_last_fetch = page_changes(master_state[url], info) if url in master_state else None
+            if since_last_fetch:
+                content_changes[url] = since_last_fetch
             # Update master state with latest content info
             new_master_state[url] = {
                 "hash": info["hash"],
                 "title": info["title"],
                 "description": info["description"],
-                "last_checked": current_run_time
+                "last_checked": current_run_time,
+                **revisit.update_entry(master_state.get(url), info["hash"], current_run_time,
+                                       changed=bool(since_last_fetch) if since_last_fetch is not None else None)
             }
+            if info.get("blocks"):
+                new_master_state[url]["blocks"] = info["blocks"]
+            if info.get("minhash"):
+                new_master_state[url]["minhash"] = info["minhash"]
+            if info.get("canonical_url"):
+                new_master_state[url]["canonical_url"] = info["canonical_url"]
+            if feed_modified and url in feed_modified:
+                new_master_state[url]["wp_modified"] = feed_modified[url]
+            elif master_state.get(url, {}).get("wp_modified"):
+                new_master_state[url]["wp_modified"] = master_state[url]["wp_modified"]
+            if url not in sitemap_set or master_state.get(url, {}).get("source") == "discovery":
+                new_master_state[url]["source"] = "discovery"
             display_info = info
         else:
             # Fallback to baseline or master data for existing URLs we didn't fetch
             display_info = master_state.get(url, baseline_state.get(url, {}))
 
-        summary_data.append({
+        row = {
             "url": url,
             "title": display_info.get("title", "No Title"),
             "description": display_info.get("description", "No Description"),
             "status": status,
             "baseline_date": baseline_state.get(url, {}).get("last_checked", "Initial"),
             "last_checked": current_run_time
-        })
+        }
+        if status == "changed":
+            row["changed_blocks"] = changed
+        visit = new_master_state.get(url, {})
+        if visit.get("next_visit"):
+            row["change_rate"] = visit.get("change_rate")
+            row["next_visit"] = visit["next_visit"]
+        summary_data.append(row)
+
+    # Listed pages unchanged since we last checked them adopt their
+    # modified_gmt, so the feed covers them from now on
+    for url, modified in (feed_modified or {}).items():
+        entry = new_master_state.get(url)
+        if entry and not entry.get("wp_modified") and not wp_feed.is_newer(modified, entry):
+            new_master_state[url] = dict(entry, wp_modified=modified)
+
+    # Sitewide template changes: changed pages whose fingerprints all moved
+    # the same way stay "changed" but are flagged so they don't bury real edits
+    changed_rows = [row for row in summary_data if row["status"] == "changed"]
+    template_urls = fingerprint.template_changes({
+        row["url"]: (baseline_state.get(row["url"], {}).get("minhash"), new_master_state.get(row["url"], {}).get("minhash"))
+        for row in changed_rows
+    })
+    for row in changed_rows:
+        if row["url"] in template_urls:
+            row["template_change"] = True
+    if template_urls:
+        print(f"🧩 {len(template_urls)} of {len(changed_rows)} changes look like a sitewide template change")
+    duplicate_clusters = fingerprint.near_duplicates({url: entry.get("minhash") for url, entry in new_master_state.items()})
 
     # Add missing/deleted pages to report
+    verified_counts = {}
     for url in deleted_urls_since_baseline:
         old_info = baseline_state.get(url, {})
+        probe = probes.get(url)
+        verified, description = describe_deletion(probe)
+        verified_counts[verified] = verified_counts.get(verified, 0) + 1
         summary_data.append({
             "url": url,
             "title": old_info.get("title", "Unknown"),
-            "description": "No longer in sitemap.",
+            "description": description,
             "status": "deleted",
+            "verified": verified,
+            "http_status": probe.get("status") if probe else None,
             "baseline_date": old_info.get("last_checked", "Initial"),
             "last_checked": current_run_time
         })
@@ -295,33 +792,73 @@ def run_targeted_monitor():
             del new_master_state[url]
 
     # 5. Save Results
+    prev_meta = load_json(REPORT_META_FILE, {})
+    seq = prev_meta.get("seq", 0) + 1
+    old_summary = load_json(SUMMARY_FILE, [])
+    old_structure = load_json(STRUCTURE_FILE, {})
+    summary_removed = stamp_summary_rows(summary_data, old_summary, seq)
+
     report_meta = {
         "prev_count": len(baseline_state),
         "curr_count": len(new_master_state),
         "prev_time": min([v.get("last_checked", "") for v in baseline_state.values()] + [current_run_time]) if baseline_state else "Initial",
         "curr_time": current_run_time,
-        "total_checked": len(urls_to_fetch)
+        "total_checked": len(urls_to_fetch) - len(unfetched),
+        "deferred_count": deferred_count,
+        "carried_over_count": len(carry_over),
+        "change_feed": feed_meta,
+        "time_budget_exhausted": bool(unfetched),
+        "ghost_new_count": len(ghost_urls),
+        "deleted_verification": verified_counts,
+        "template_change_count": len(template_urls),
+        "duplicate_cluster_count": len(duplicate_clusters),
+        "duplicate_clusters": [dict(c, urls=c["urls"][:DUPLICATE_CLUSTER_URLS]) for c in duplicate_clusters[:DUPLICATE_CLUSTER_LIMIT]],
+        "scope": sections or "full",
+        "seq": seq,
+        "sync_epoch": prev_meta.get("sync_epoch") or datetime.now().strftime("%Y%m%d%H%M%S")
     }
 
-    with SUMMARY_FILE.open("w", encoding="utf-8") as f:
-        json.dump(summary_data, f, indent=4, ensure_ascii=False)
-    with STATE_FILE.open("w", encoding="utf-8") as f:
-        json.dump(new_master_state, f, indent=4, ensure_ascii=False)
-    with REPORT_META_FILE.open("w", encoding="utf-8") as f:
-        json.dump(report_meta, f, indent=4, ensure_ascii=False)
+    metrics.begin("write")
+    save_json(SUMMARY_FILE, summary_data)
+    save_json(STATE_FILE, new_master_state)
+
+    # Update site_structure.json for external visibility
+    save_json(STRUCTURE_FILE, {url: 2 for url in new_master_state.keys()})
+
+    # Record what this scan changed so dashboards can poll with a cursor
+    changes = load_json(CHANGES_FILE, [])
+    changes.append({
+        "seq": seq,
+        "timestamp": current_run_time,
+        "summary_removed": sorted(summary_removed),
+        "structure_added": sorted(set(new_master_state) - set(old_structure)),
+        "structure_removed": sorted(set(old_structure) - set(new_master_state))
+    })
+    changes = changes[-CHANGE_JOURNAL_LIMIT:]
+    save_json(CHANGES_FILE, changes)
+
+    fetch_queue.save(carry_over, current_run_time)
+    if feed_modified is not None:
+        feed = wp_feed.load()
+        cursor = wp_feed.next_cursor(feed, feed_modified, current_run_time)
+        if cursor != feed:
+            wp_feed.save(cursor)
+
+    # Rolling per-URL latency/size window for slow-page reporting
+    fetch_stats.save(fetch_stats.record(fetch_stats.load(), results, current_run_time, set(new_master_state)))
+
+    # The breakdown covers the scan up to here (history and meta writes
+    # aside), and is shared by the history entry and the meta
+    metrics.end()
+    report_meta["metrics"] = metrics.snapshot()
 
     # 6. Append to History
-    history = []
-    if HISTORY_FILE.exists():
-        try:
-            with HISTORY_FILE.open("r", encoding="utf-8") as f:
-                history = json.load(f)
-        except: pass
+    history = load_json(HISTORY_FILE, [])
     
     # Calculate counts and details for history
     h_new_urls = [item["url"] for item in summary_data if item["status"] == "new"]
     h_del_urls = [item["url"] for item in summary_data if item["status"] == "deleted"]
-    h_chg_count = sum(1 for item in summary_data if item["status"] == "changed")
+    h_chg_urls = [item["url"] for item in summary_data if item["status"] == "changed"]
     
     history.append({
         "timestamp": current_run_time,
@@ -329,23 +866,81 @@ def run_targeted_monitor():
         "total_count": len(new_master_state),
         "new_count": len(h_new_urls),
         "deleted_count": len(h_del_urls),
-        "changed_count": h_chg_count,
+        "changed_count": len(h_chg_urls),
+        "template_change_count": len(template_urls),
         "new_details": h_new_urls,
-        "deleted_details": h_del_urls
+        "deleted_details": h_del_urls,
+        "changed_details": h_chg_urls,
+        "scope": sections or "full",
+        "seq": seq,
+        "metrics": report_meta["metrics"]
     })
     
     # Keep last 2000 entries (approx. 5.5 years of daily scans)
     history = history[-2000:]
     
-    with HISTORY_FILE.open("w", encoding="utf-8") as f:
-        json.dump(history, f, indent=4, ensure_ascii=False)
+    save_json(HISTORY_FILE, history)
+    # Chart-sized copies of the history series (GET /api/history-series)
+    history_series.save(history_series.build(history, current_run_time))
 
-    # Update site_structure.json for external visibility
-    with STRUCTURE_FILE.open("w", encoding="utf-8") as f:
-        json.dump({url: 2 for url in new_master_state.keys()}, f, indent=4, ensure_ascii=False)
+    # Per-URL timeline (GET /api/url-timeline): new/deleted when a page's
+    # report status turns to it, changed whenever its content moved since
+    # the previous fetch
+    events_index = url_events.load()
+    if not events_index:
+        events_index = url_events.rebuild(history[:-1])
+    old_status = {row.get("url"): row.get("status") for row in old_summary if isinstance(row, dict)}
+    scan_events = [(row["url"], row["status"], None) for row in summary_data
+                   if row["status"] in ("new", "deleted") and old_status.get(row["url"]) != row["status"]]
+    for url in sorted(content_changes):
+        scan_events.append((url, "changed", {"blocks": content_changes[url], "template": True} if url in template_urls
+                            else {"blocks": content_changes[url]}))
+    url_events.save(url_events.record(events_index, seq, current_run_time, scan_events))
+
+    # Search index (GET /api/search): only pages whose title or description
+    # changed are re-tokenized
+    search_index.sync(new_master_state)
+
+    # Meta goes last: its seq is the cursor clients sync against
+    save_json(REPORT_META_FILE, report_meta)
+    page_cache.evict()
+    snapshots.prune(set(e.get("hash") for e in list(new_master_state.values()) + list(baseline_state.values())))
 
     print(f"\n✨ Monitoring complete. XML Diff found {len(new_urls_since_baseline)} new and {len(deleted_urls_since_baseline)} deleted pages.")
     return True
 
 if __name__ == "__main__":
-    run_targeted_monitor()
+    import argparse
+    parser = argparse.ArgumentParser(description="Splashtop JP sitemap differential monitor")
+    parser.add_argument("--sections", help="Comma-separated paths to re-check (e.g. /news,/blog). Default: all dynamic paths")
+    parser.add_argument("--force", action="store_true", help="Re-fetch every priority URL, ignoring learned revisit intervals")
+    parser.add_argument("--budget", type=int, default=revisit.MAX_FETCHES_PER_RUN, help="Max pages fetched per run")
+    parser.add_argument("--time-budget", type=float, default=None, metavar="SECONDS",
+                        help="Stop starting page fetches after this many seconds; the rest carry over to the next run")
+    parser.add_argument("--discover", action="store_true", help="Deep discovery: probe unlisted links found in fetched pages")
+    parser.add_argument("--profile", action="store_true", help="Profile this run (cProfile + tracemalloc) into profiles/")
+    parser.add_argument("--delta-state", action="store_true",
+                        help="Persist state, summary, structure and history under state/ as base + delta patches")
+    archive_group = parser.add_mutually_exclusive_group()
+    archive_group.add_argument("--record", nargs="?", const=str(http_archive.DEFAULT_ARCHIVE), metavar="ARCHIVE",
+                               help="Record every HTTP exchange to a compressed archive")
+    archive_group.add_argument("--replay", nargs="?", const=str(http_archive.DEFAULT_ARCHIVE), metavar="ARCHIVE",
+                               help="Serve every request from a recorded archive (no network)")
+    args = parser.parse_args()
+
+    if args.delta_state:
+        os.environ["MONITOR_DELTA_STATE"] = "1"
+    archive = None
+    if args.record:
+        archive = http_archive.record(SESSION, args.record, pool_maxsize=PROBE_WORKERS)
+    elif args.replay:
+        archive = http_archive.replay(SESSION, args.replay)
+    try:
+        run_targeted_monitor(sections=args.sections.split(",") if args.sections else None, force=args.force,
+                             fetch_budget=args.budget, deep_discovery=args.discover, profile=args.profile,
+                             time_budget=args.time_budget)
+    finally:
+        if archive:
+            archive.close()
+            print(f"📼 {archive.count} HTTP exchanges {'recorded' if args.record else 'replayed'}" +
+                  (f", {archive.misses} not in archive" if args.replay else ""))
@@ -0,0 +1,93 @@
+import difflib
+import sqlite3
+import threading
+import time
+import zlib
+from pathlib import Path
+
+# Page text by content hash (the "hash" of state entries), so the server can
+# diff a page's baseline and current versions on demand. Scans only store
+# compressed text; no diff is computed until someone asks for one.
+SNAPSHOT_FILE = Path(".page_snapshots.sqlite")
+# Unreferenced snapshots older than this are pruned after each scan
+KEEP_UNREFERENCED = 3 * 24 * 60 * 60
+# Diffs longer than this are cut off (the page was effectively rewritten)
+MAX_DIFF_LINES = 2000
+CONTEXT_LINES = 2
+
+_local = threading.local()
+
+
+def _db():
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = sqlite3.connect(str(SNAPSHOT_FILE), timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("""CREATE TABLE IF NOT EXISTS snapshots (
+            hash TEXT PRIMARY KEY,
+            text BLOB NOT NULL,
+            stored_at REAL NOT NULL)""")
+        _local.conn = conn
+    return conn
+
+
+def put(content_hash, text):
+    try:
+        conn = _db()
+        with conn:
+            conn.execute("INSERT OR IGNORE INTO snapshots VALUES (?, ?, ?)",
+                         (content_hash, zlib.compress(text.encode("utf-8"), 6), time.time()))
+    except sqlite3.Error as e:
+        print(f"⚠️ Snapshot write failed: {e}")
+
+
+def get(content_hash):
+    try:
+        row = _db().execute("SELECT text FROM snapshots WHERE hash = ?", (content_hash,)).fetchone()
+        return zlib.decompress(row[0]).decode("utf-8") if row else None
+    except sqlite3.Error as e:
+        print(f"⚠️ Snapshot read failed: {e}")
+        return None
+
+
+def prune(keep_hashes, max_age=KEEP_UNREFERENCED):
+    # Drops snapshots no state entry refers to, once they are max_age old
+    try:
+        conn = _db()
+        conn.execute("CREATE TEMP TABLE IF NOT EXISTS keep (hash TEXT PRIMARY KEY)")
+        with conn:
+            conn.execute("DELETE FROM keep")
+            conn.executemany("INSERT OR IGNORE INTO keep VALUES (?)", ((h,) for h in keep_hashes))
+            cur = conn.execute("DELETE FROM snapshots WHERE stored_at < ? AND hash NOT IN (SELECT hash FROM keep)",
+                               (time.time() - max_age,))
+        return cur.rowcount
+    except sqlite3.Error as e:
+        print(f"⚠️ Snapshot prune failed: {e}")
+        return 0
+
+
+def _lines(text):
+    # get_text() output is mostly blank lines and indentation
+    return [" ".join(line.split()) for line in text.splitlines() if line.strip()]
+
+
+def diff(old_hash, new_hash):
+    # Unified diff between two stored versions, or None if either is missing
+    old_text, new_text = get(old_hash), get(new_hash)
+    if old_text is None or new_text is None:
+        return None
+    lines, added, removed = [], 0, 0
+    for line in difflib.unified_diff(_lines(old_text), _lines(new_text), "baseline", "current", n=CONTEXT_LINES, lineterm=""):
+        if line.startswith("+") and not line.startswith("+++"):
+            added += 1
+        elif line.startswith("-") and not line.startswith("---"):
+            removed += 1
+        lines.append(line)
+    return {
+        "old_hash": old_hash,
+        "new_hash": new_hash,
+        "added": added,
+        "removed": removed,
+        "truncated": len(lines) > MAX_DIFF_LINES,
+        "lines": lines[:MAX_DIFF_LINES]
+    }
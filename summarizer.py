@@ -1,34 +1,26 @@
-import requests
-from bs4 import BeautifulSoup
-import json
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
+import page_cache
+import smart_monitor
+
 STRUCTURE_FILE = Path("site_structure.json")
 SUMMARY_FILE = Path("site_summary.json")
 
 def get_page_metadata(url):
-    try:
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
-        }
-        response = requests.get(url, timeout=10, headers=headers)
-        if response.status_code == 200:
-            soup = BeautifulSoup(response.text, 'html.parser')
-            title = soup.title.string.strip() if soup.title else "No Title"
-            meta_desc = soup.find("meta", {"name": "description"})
-            description = meta_desc["content"].strip() if meta_desc and "content" in meta_desc.attrs else "No Description"
-            return title, description
-    except Exception as e:
-        print(f"Error fetching {url}: {e}")
+    # Served from the shared page cache when a recent scan already fetched it
+    info = smart_monitor.get_page_info(url, max_age=page_cache.DEFAULT_TTL)
+    if info["status"] == "success":
+        return info["title"], info["description"]
     return "Error", "Error"
 
 def generate_summary():
-    if not STRUCTURE_FILE.exists():
+    # Through smart_monitor's loaders, which also read the delta store (state/)
+    if not smart_monitor.data_exists(STRUCTURE_FILE):
         print("Structure file not found.")
         return False
 
-    with STRUCTURE_FILE.open("r", encoding="utf-8") as f:
-        structure = json.load(f)
+    structure = smart_monitor.read_json(STRUCTURE_FILE)
 
     # Filter for important pages (Depth 0 and 1)
     important_urls = [url for url, depth in structure.items() if depth <= 1]
@@ -36,17 +28,16 @@ def generate_summary():
     summary_data = []
     print(f"Fetching metadata for {len(important_urls)} important URLs...")
     
-    for url in important_urls:
-        print(f"Processing: {url}")
-        title, desc = get_page_metadata(url)
-        summary_data.append({
-            "url": url,
-            "title": title,
-            "description": desc
-        })
-
-    with SUMMARY_FILE.open("w", encoding="utf-8") as f:
-        json.dump(summary_data, f, indent=4, ensure_ascii=False)
+    with ThreadPoolExecutor(max_workers=10) as executor:
+        for url, (title, desc) in zip(important_urls, executor.map(get_page_metadata, important_urls)):
+            print(f"Processing: {url}")
+            summary_data.append({
+                "url": url,
+                "title": title,
+                "description": desc
+            })
+
+    smart_monitor.save_json(SUMMARY_FILE, summary_data)
 
     print(f"\nSummary generated in {SUMMARY_FILE}")
     return True
@@ -0,0 +1,54 @@
+import pytest
+from bs4 import BeautifulSoup
+
+import block_hash
+import smart_monitor
+import snapshots
+
+
+@pytest.fixture(autouse=True)
+def snapshot_store(tmp_path, monkeypatch):
+    # parse_page keeps the page text by hash
+    monkeypatch.setattr(snapshots, "SNAPSHOT_FILE", tmp_path / "snapshots.sqlite")
+    monkeypatch.setattr(snapshots, "_local", snapshots.threading.local())
+
+
+def page(title="料金プラン", hero="今なら30日間無料", section="個人向けプラン", footer="© 2026"):
+    return f"""<html><head><title>{title}</title><meta name="description" content="料金のご案内"></head>
+<body><header><nav><a href="/">Home</a></nav></header>
+<div class="hero"><h1>{hero}</h1></div>
+<main><section><h2>{section}</h2><p>月額</p></section><section><h2>法人向けプラン</h2><p>年額</p></section></main>
+<footer>{footer}</footer></body></html>"""
+
+
+def info(html):
+    return smart_monitor.parse_page("https://example.com/pricing/", html)[0]
+
+
+def test_title_edit_is_a_change():
+    assert smart_monitor.page_changes(info(page()), info(page(title="料金プラン改定"))) == ["meta"]
+
+
+def test_text_outside_main_is_a_change():
+    assert smart_monitor.page_changes(info(page()), info(page(hero="今なら60日間無料"))) == ["outside"]
+
+
+def test_main_sections_and_template_blocks():
+    assert smart_monitor.page_changes(info(page()), info(page(section="個人向け"))) == ["main/0"]
+    assert smart_monitor.page_changes(info(page()), info(page(footer="© 2027"))) == []
+    assert smart_monitor.page_changes(info(page()), info(page())) == []
+
+
+def test_trees_of_another_layout_fall_back_to_the_text_hash():
+    old, new = info(page()), info(page())
+    old["blocks"] = dict(old["blocks"], v=1)
+    assert smart_monitor.page_changes(old, new) == []
+    changed = info(page(title="料金プラン改定"))
+    assert smart_monitor.page_changes(old, changed) == ["page"]
+
+
+def test_pages_without_main_cover_all_non_template_text():
+    html = "<html><body><nav>Menu</nav><div><p>{}</p></div></body></html>"
+    old = block_hash.build_tree(BeautifulSoup(html.format("本文"), "html.parser"))
+    new = block_hash.build_tree(BeautifulSoup(html.format("本文を更新"), "html.parser"))
+    assert block_hash.changed_blocks(old, new) == ["main/1"]
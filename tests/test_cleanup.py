@@ -0,0 +1,59 @@
+import json
+
+import cleanup
+
+FIXTURE = {
+    "https://example.com/news/a/": {"hash": "ab12", "change_rate": 0.5, "revisit_hours": 3.5e1, "checks": 12,
+                                    "title": "導入事例 \"quoted\" \\ slash", "blocks": {"h": "x", "c": {"0": {"h": "y"}}}},
+    "https://example.com/news/a": {"hash": "cd34", "change_rate": -0.0625, "revisit_hours": 1e-3, "ok": True},
+    "ftp://example.com/file": {"hash": None, "items": [0.5, 10, 2.75E+2, False, None]},
+    "https://example.com/blog/b?x=1": {"change_rate": 123456.789, "description": "desc ｶﾀｶﾅ"},
+}
+
+
+def test_iter_json_items_every_chunk_size(tmp_path, monkeypatch):
+    # Every value boundary, numbers cut after "0." or "3.5e" included, lands
+    # on a chunk edge for some chunk size
+    for data in (FIXTURE, list(FIXTURE.values()), [0.5], {}, []):
+        path = tmp_path / "fixture.json"
+        text = json.dumps(data, indent=4, ensure_ascii=False)
+        path.write_text(text, encoding="utf-8")
+        for size in range(1, len(text) + 2):
+            monkeypatch.setattr(cleanup, "CHUNK_SIZE", size)
+            items = list(cleanup.iter_json_items(path))
+            if isinstance(data, dict):
+                assert dict(items) == json.loads(text), size
+            else:
+                assert [v for _, v in items] == json.loads(text), size
+
+
+def test_cleanup_dedupes_and_resets_sync_epoch(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.delenv("MONITOR_DELTA_STATE", raising=False)
+    (tmp_path / "site_state.json").write_text(json.dumps(FIXTURE), encoding="utf-8")
+    (tmp_path / "site_report_meta.json").write_text(json.dumps({"seq": 4, "sync_epoch": "20260101000000"}), encoding="utf-8")
+
+    reports = cleanup.run_cleanup()
+
+    state = json.loads((tmp_path / "site_state.json").read_text(encoding="utf-8"))
+    assert list(state) == ["https://example.com/news/a", "https://example.com/blog/b"]
+    assert state["https://example.com/news/a"] == FIXTURE["https://example.com/news/a/"]
+    assert reports[0]["dropped"] == 2 and reports[0]["rewritten"] == 2
+    meta = json.loads((tmp_path / "site_report_meta.json").read_text(encoding="utf-8"))
+    assert meta["seq"] == 4 and meta["sync_epoch"] != "20260101000000"
+
+
+def test_cleanup_rewrites_delta_store(tmp_path, monkeypatch):
+    import delta_store
+    import smart_monitor
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("MONITOR_DELTA_STATE", "1")
+    smart_monitor.save_json(smart_monitor.STATE_FILE, FIXTURE)
+    assert not (tmp_path / "site_state.json").exists()
+
+    report = cleanup.cleanup_json("site_state.json")
+
+    assert report["dropped"] == 2 and report["rewritten"] == 2
+    state = delta_store.load("site_state.json")
+    assert list(state) == ["https://example.com/news/a", "https://example.com/blog/b"]
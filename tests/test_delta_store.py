@@ -0,0 +1,120 @@
+import copy
+import json
+import random
+
+import pytest
+
+import delta_store
+
+
+@pytest.fixture
+def store(tmp_path):
+    return tmp_path / "state"
+
+
+def page(i, checked, **extra):
+    return dict({"hash": f"h{i}", "title": f"ページ {i}", "last_checked": checked,
+                 "blocks": {"h": f"b{i}", "c": {"0": {"h": f"c{i}"}}}}, **extra)
+
+
+def test_round_trip_with_compaction(store):
+    rng = random.Random(7)
+    state, history, daily = {}, [], {}
+    for run in range(120):
+        stamp = f"2026-01-01T00:00:{run:02d}"
+        for _ in range(6):
+            i = rng.randint(0, 60)
+            state[f"u{i}"] = page(i, stamp, rate=rng.random())
+        if rng.random() < 0.3:
+            state.pop(rng.choice(list(state)), None)
+        if rng.random() < 0.2:
+            key = rng.choice(list(state))
+            state[key] = {f: v for f, v in state[key].items() if f != "rate"}
+        if run % 7 == 1 or run == 0:
+            daily = copy.deepcopy(delta_store.load("site_state.json", {}, store))
+            delta_store.save("site_state_daily.json", daily, store)
+        history = (history + [{"seq": run, "timestamp": stamp}])[-20:]
+        summary = [{"url": k, "last_checked": stamp, "baseline_date": daily.get(k, {}).get("last_checked", "Initial"),
+                    "rate": v.get("rate")} for k, v in state.items()]
+        delta_store.save("site_state.json", state, store)
+        delta_store.save("monitoring_history.json", history, store)
+        delta_store.save("site_summary.json", summary, store)
+
+        assert delta_store.load("site_state.json", None, store) == state
+        assert delta_store.load("site_state_daily.json", None, store) == daily
+        assert delta_store.load("monitoring_history.json", None, store) == history
+        loaded = delta_store.load("site_summary.json", None, store)
+        assert sorted(loaded, key=lambda r: r["url"]) == sorted(summary, key=lambda r: r["url"])
+
+
+def test_unchanged_run_writes_a_small_patch(store):
+    # 400 pages, only the scan timestamp moves: one remap line, not 400 rows
+    summary = [{"url": f"https://example.com/p{i}/", "title": f"t{i}", "status": "stable",
+                "last_checked": "2026-01-01T00:00:00", "baseline_date": "2025-12-31T00:00:00"} for i in range(400)]
+    assert delta_store.save("site_summary.json", summary, store) == "base"
+    assert delta_store.save("site_summary.json", summary, store) == "unchanged"
+    moved = [dict(row, last_checked="2026-01-02T00:00:00", baseline_date="2026-01-01T00:00:00") for row in summary]
+    assert delta_store.save("site_summary.json", moved, store) == "patched"
+    log = (store / "site_summary.delta.jsonl").read_text(encoding="utf-8")
+    assert len(log) < 200
+    assert delta_store.load("site_summary.json", None, store) == moved
+
+
+def test_changed_record_patches_only_its_fields(store):
+    state = {f"u{i}": page(i, "t0") for i in range(50)}
+    delta_store.save("site_state.json", state, store)
+    state["u3"] = dict(state["u3"], hash="new")
+    delta_store.save("site_state.json", state, store)
+    patch = json.loads((store / "site_state.delta.jsonl").read_text(encoding="utf-8"))
+    assert patch["upd"] == {"u3": {"hash": "new"}}
+    assert delta_store.load("site_state.json", None, store) == state
+
+
+def test_daily_baseline_is_a_pointer_until_the_state_compacts(store, monkeypatch):
+    state = {f"u{i}": page(i, "t0") for i in range(50)}
+    delta_store.save("site_state.json", state, store)
+    state["u1"] = dict(state["u1"], hash="x")
+    delta_store.save("site_state.json", state, store)
+    daily = copy.deepcopy(state)
+
+    assert delta_store.save("site_state_daily.json", daily, store) == "ref"
+    assert (store / "site_state_daily.base.json").stat().st_size < 200
+
+    state["u2"] = dict(state["u2"], hash="y")
+    delta_store.save("site_state.json", state, store)
+    assert delta_store.load("site_state_daily.json", None, store) == daily
+
+    monkeypatch.setattr(delta_store, "COMPACT_AFTER", 1)
+    state["u4"] = dict(state["u4"], hash="z")
+    assert delta_store.save("site_state.json", state, store) == "compacted"
+    assert delta_store.load("site_state_daily.json", None, store) == daily
+    assert delta_store.load("site_state.json", None, store) == state
+
+
+def test_torn_and_stale_patches_are_ignored(store):
+    structure = {"a": 2, "b": 2}
+    delta_store.save("site_structure.json", structure, store)
+    structure["c"] = 2
+    delta_store.save("site_structure.json", structure, store)
+    with (store / "site_structure.delta.jsonl").open("a", encoding="utf-8") as f:
+        f.write('{"g": 0, "set": {"stale": 1}}\n{"g": 1, "set": {"torn"')
+    assert delta_store.load("site_structure.json", None, store) == structure
+
+
+def test_reordered_history_compacts(store):
+    history = [{"seq": i, "timestamp": f"t{i}"} for i in range(5)]
+    delta_store.save("monitoring_history.json", history, store)
+    assert delta_store.save("monitoring_history.json", history[::-1], store) == "compacted"
+    assert delta_store.load("monitoring_history.json", None, store) == history[::-1]
+
+
+def test_change_journal_appends_one_line_per_scan(store):
+    journal = [{"seq": i, "timestamp": f"t{i}", "summary_removed": [], "structure_added": [f"u{i}"],
+                "structure_removed": []} for i in range(500)]
+    delta_store.save("site_changes.json", journal, store)
+    journal = journal[1:] + [{"seq": 500, "timestamp": "t500", "summary_removed": [],
+                              "structure_added": [], "structure_removed": ["u3"]}]
+    assert delta_store.save("site_changes.json", journal, store) == "patched"
+    log = (store / "site_changes.delta.jsonl").read_text(encoding="utf-8")
+    assert log.count("\n") == 1 and len(log) < 200
+    assert delta_store.load("site_changes.json", None, store) == journal
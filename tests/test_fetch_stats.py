@@ -0,0 +1,27 @@
+import fetch_stats
+
+
+def info(url, status, size, total_ms=100.0):
+    return {"url": url, "fetch": {"ttfb_ms": total_ms / 2, "total_ms": total_ms, "bytes": size, "status": status}}
+
+
+def test_revalidations_do_not_count_as_zero_bytes():
+    stats = {}
+    stats = fetch_stats.record(stats, [info("https://a/", 200, 50000), info("https://b/", 200, 9000)], "t1")
+    # Warm cache: most later fetches are bodiless 304s
+    for n in range(2, 8):
+        stats = fetch_stats.record(stats, [info("https://a/", 304, 0), info("https://b/", 304, 0)], f"t{n}")
+    stats = fetch_stats.record(stats, [info("https://b/", 200, 11000)], "t9")
+
+    summary = stats["summary"]
+    assert summary["bytes"]["p50"] == 11000
+    assert summary["status"] == {"200": 3, "304": 12}
+    assert [(row["url"], row["bytes"]) for row in summary["largest"]] == [("https://a/", 50000), ("https://b/", 9000)]
+    assert all(sample[3] is None for sample in stats["urls"]["https://a/"][1:])
+
+
+def test_old_samples_with_304_sizes_are_ignored():
+    urls = {"https://a/": [["t1", 10, 20, 4000, 200], ["t2", 10, 20, 0, 304], ["t3", 10, 20, 0, 304]]}
+    summary = fetch_stats.report(urls)
+    assert summary["bytes"]["p50"] == 4000
+    assert summary["largest"][0]["bytes"] == 4000
@@ -0,0 +1,82 @@
+import random
+
+import pytest
+
+import fingerprint
+
+pytestmark = pytest.mark.skipif(not fingerprint.available(), reason="NumPy not installed")
+
+LETTERS = "abcdefghijklmnopqrstuvwxyz"
+
+
+def words(rng, n):
+    return " ".join("".join(rng.choice(LETTERS) for _ in range(rng.randint(3, 8))) for _ in range(n))
+
+
+def site(n=16):
+    rng = random.Random(3)
+    header = "Home About Contact " + words(rng, 40)
+    return {f"https://example.com/p{i}/": (header, words(rng, 300)) for i in range(n)}
+
+
+def pairs(pages, edits):
+    return {url: (fingerprint.signature(" ".join(old)), fingerprint.signature(" ".join(edits.get(url, old))))
+            for url, old in pages.items() if url in edits}
+
+
+def test_sitewide_edit_is_told_apart_from_page_edits():
+    pages = site()
+    urls = sorted(pages)
+    rng = random.Random(11)
+    banner = "Notice " + words(rng, 60)
+    edits = {}
+    # One site-wide edit: the same banner added to eight pages' header
+    for url in urls[:8]:
+        header, body = pages[url]
+        edits[url] = (header + " " + banner, body)
+    # Distinct edits of their own on six more pages
+    for url in urls[8:14]:
+        header, body = pages[url]
+        edits[url] = (header, body + " " + words(rng, 60))
+    # And one page with both
+    header, body = pages[urls[14]]
+    edits[urls[14]] = (header + " " + banner, body + " " + words(rng, 60))
+
+    flagged = fingerprint.template_changes(pairs(pages, edits))
+    # Pages with edits of their own are never flagged; a template page whose
+    # banner moved a slot on it alone stays unflagged too (the safe side)
+    assert flagged <= set(urls[:8])
+    assert len(flagged) >= 4
+
+
+def test_page_edits_alone_are_not_a_template_change():
+    pages = site()
+    rng = random.Random(5)
+    added = {url: (header, body + " " + words(rng, 60)) for url, (header, body) in pages.items()}
+    assert fingerprint.template_changes(pairs(pages, added)) == set()
+    # Dropping text of their own makes pages fall back to the shared header
+    cut = {url: (header, body[:len(body) // 2]) for url, (header, body) in pages.items()}
+    assert fingerprint.template_changes(pairs(pages, cut)) == set()
+
+
+def test_unmoved_signatures_are_not_flagged():
+    pages = site()
+    urls = sorted(pages)
+    rng = random.Random(11)
+    banner = "Notice " + words(rng, 60)
+    edits = {url: (pages[url][0] + " " + banner, pages[url][1]) for url in urls[:12]}
+    # Whitespace only: content hash changes, the signature does not
+    edits[urls[12]] = (pages[urls[12]][0] + "  ", pages[urls[12]][1])
+    flagged = fingerprint.template_changes(pairs(pages, edits))
+    assert urls[12] not in flagged
+    assert flagged and flagged <= set(urls[:12])
+
+
+def test_near_duplicates():
+    pages = site(6)
+    urls = sorted(pages)
+    signatures = {url: fingerprint.signature(" ".join(text)) for url, text in pages.items()}
+    header, body = pages[urls[0]]
+    signatures["https://example.com/copy/"] = fingerprint.signature(header + " " + body + " (copy)")
+    clusters = fingerprint.near_duplicates(signatures)
+    assert [sorted(c["urls"]) for c in clusters] == [["https://example.com/copy/", urls[0]]]
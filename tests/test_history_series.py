@@ -0,0 +1,48 @@
+from datetime import datetime, timedelta
+
+import history_series
+
+
+def history(n, spike_at=None):
+    start = datetime(2024, 1, 1)
+    return [{"timestamp": (start + timedelta(days=i)).isoformat(), "total_count": 1000 + i % 7,
+             "new_count": 50 if i == spike_at else 0, "deleted_count": 0, "changed_count": i % 3}
+            for i in range(n)]
+
+
+def test_lttb_keeps_endpoints_count_and_spikes():
+    points = history_series.raw_series(history(1200, spike_at=613), "new_count")
+    picked = history_series.lttb(points, 100)
+    assert len(picked) == 100
+    assert picked[0] == points[0] and picked[-1] == points[-1]
+    assert [p[0] for p in picked] == sorted(p[0] for p in picked)
+    assert all(p in points for p in picked)
+    assert [points[613][0], 50] in picked
+    # Nothing to drop
+    assert history_series.lttb(points[:50], 100) == points[:50]
+
+
+def test_query_uses_fresh_levels_for_the_full_range():
+    entries = history(1200)
+    series = history_series.build(entries, "2027-04-15T00:00:00")
+    assert sorted(series["levels"]["total_count"], key=int) == ["100", "250", "500", "1000"]
+
+    result = history_series.query(entries, series, "total_count", width=300)
+    assert result["source"] == "level-500"
+    assert len(result["points"]) == 300
+    # Wider than every level: downsampled from the raw entries
+    assert history_series.query(entries, series, "total_count", width=1100)["source"] == "raw"
+
+
+def test_query_falls_back_to_raw_for_ranges_and_stale_levels():
+    entries = history(1200)
+    series = history_series.build(entries[:-1])
+    stale = history_series.query(entries, series, "changed_count", width=200)
+    assert stale["source"] == "raw" and stale["points"][-1][0] == entries[-1]["timestamp"]
+
+    series = history_series.build(entries)
+    start, end = entries[100]["timestamp"], entries[399]["timestamp"]
+    ranged = history_series.query(entries, series, "changed_count", width=1000, start=start, end=end)
+    assert ranged["source"] == "raw" and ranged["total"] == 300
+    assert ranged["points"][0][0] == start and ranged["points"][-1][0] == end
+    assert len(history_series.query(entries, {}, width=1)["points"]) == 3
@@ -0,0 +1,25 @@
+import link_graph
+
+
+def crawl(path):
+    writer = link_graph.LinkGraphWriter(path)
+    writer.add_node("https://example.com", 0)
+    writer.add_node("https://example.com/a", 1)
+    writer.add_node("https://example.com/b", 1)
+    writer.add_links("https://example.com", ["https://example.com/a", "https://example.com/b"])
+    writer.add_links("https://example.com/a", ["https://example.com", "https://example.com/a"])
+    writer.add_links("https://example.com/b", [])
+    writer.close()
+
+
+def test_orphans_of_sitemap_pages_with_trailing_slashes(tmp_path):
+    crawl(tmp_path / "links.jsonl")
+    graph = link_graph.build_index(tmp_path / "links.jsonl", tmp_path / "index.json")
+    sitemap = ["https://example.com/", "https://example.com/a/", "https://example.com/b/",
+               "https://example.com/landing/"]
+    # /landing/ is in the sitemap but no page links to it
+    assert graph.orphans(sitemap) == ["https://example.com/landing/"]
+    assert graph.orphans() == []
+    assert graph.inbound("https://example.com/a/") == ["https://example.com"]
+    assert graph.inbound_count("https://example.com/b/?utm=x") == 1
+    assert link_graph.LinkGraph.load(tmp_path / "index.json").orphans(sitemap) == ["https://example.com/landing/"]
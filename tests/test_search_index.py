@@ -0,0 +1,63 @@
+import pytest
+
+import search_index
+
+
+@pytest.fixture(autouse=True)
+def index(tmp_path, monkeypatch):
+    monkeypatch.setattr(search_index, "INDEX_FILE", tmp_path / "index.sqlite")
+    monkeypatch.setattr(search_index, "_local", search_index.threading.local())
+
+
+def page(title, description=""):
+    return {"title": title, "description": description}
+
+
+def aggregates():
+    conn = search_index._db()
+    row = conn.execute("SELECT COUNT(*), SUM(title_len), SUM(description_len), SUM(body_len) FROM docs").fetchone()
+    return row[0], [n or 0 for n in row[1:]]
+
+
+def test_stats_follow_updates_and_removals():
+    pages = {f"https://example.com/{i}": page(f"リモートデスクトップ {i}", "導入事例" * (i % 3)) for i in range(20)}
+    search_index.sync(pages)
+    assert search_index._stats(search_index._db()) == aggregates()
+
+    del pages["https://example.com/3"]
+    pages["https://example.com/4"] = page("料金プラン", "サポート")
+    pages["https://example.com/new"] = page("セキュリティ")
+    result = search_index.sync(pages)
+    assert result == {"indexed": 2, "removed": 1, "documents": 20}
+    assert search_index._stats(search_index._db()) == aggregates()
+    assert search_index.count() == 20
+
+    search_index.sync({})
+    assert search_index._stats(search_index._db()) == (0, [0, 0, 0])
+
+
+def test_search_ranks_title_hits_and_pages():
+    search_index.sync({
+        "https://example.com/a": page("リモートアクセス 料金", "価格の案内"),
+        "https://example.com/b": page("導入事例", "リモートアクセスで在宅勤務"),
+        "https://example.com/c": page("セキュリティ", "暗号化について"),
+    })
+    result = search_index.search("リモート アクセス")
+    assert [row["url"] for row in result["results"]] == ["https://example.com/a", "https://example.com/b"]
+    assert result["total"] == 2
+    # Full-width and half-width forms match alike
+    assert search_index.search("ﾘﾓｰﾄ")["total"] == 2
+    both = search_index.search("リ", per_page=2)["results"]
+    assert search_index.search("リ", per_page=1, page=2)["results"] == both[1:]
+    assert search_index.search("存在しない")["total"] == 0
+
+
+def test_stats_are_backfilled_for_an_older_index():
+    search_index.sync({"https://example.com/a": page("リモート"), "https://example.com/b": page("サポート", "料金")})
+    conn = search_index._db()
+    with conn:
+        conn.execute("DROP TABLE meta")
+    search_index._local.conn = None
+    conn.close()
+    assert search_index._stats(search_index._db()) == aggregates()
+    assert search_index.search("サポート")["total"] == 1
@@ -0,0 +1,48 @@
+import smart_monitor
+
+
+def probe(url, status, location=None):
+    return {"url": url, "status": status, "content_type": "text/html", "location": location}
+
+
+def test_redirect_to_another_page_is_gone():
+    url = "https://example.com/jp/news/item-1"
+    assert smart_monitor.is_gone(probe(url, 404))
+    assert smart_monitor.is_gone(probe(url, 301, "https://example.com/jp/news/item-2"))
+    assert smart_monitor.is_gone(probe(url, 302, "/"))
+    assert smart_monitor.is_gone(probe(url, 301))
+
+
+def test_canonicalizing_redirect_is_not_gone():
+    url = "http://example.com/jp/news/item-1"
+    assert not smart_monitor.is_gone(probe(url, 301, "https://example.com/jp/news/item-1/"))
+    assert not smart_monitor.is_gone(probe(url, 301, "https://www.example.com/jp/news/item-1"))
+    assert not smart_monitor.is_gone(probe(url, 308, "/jp/news/item-1/"))
+    assert not smart_monitor.is_gone(probe(url, 200))
+    assert not smart_monitor.is_gone(None)
+
+
+def test_discovery_remembers_only_final_decisions(tmp_path, monkeypatch):
+    base = "https://example.com"
+    probes = {
+        f"{base}/ok": probe(f"{base}/ok", 200),
+        f"{base}/gone": probe(f"{base}/gone", 404),
+        f"{base}/down": {"url": f"{base}/down", "status": None, "error": "timeout"},
+        f"{base}/busy": probe(f"{base}/busy", 503),
+        f"{base}/flaky": probe(f"{base}/flaky", 200),
+    }
+    fetched = {
+        f"{base}/ok": {"url": f"{base}/ok", "status": "success", "title": "OK", "fetch": {"status": 200}},
+        f"{base}/flaky": {"url": f"{base}/flaky", "status": "error", "fetch": {"status": None}},
+    }
+    monkeypatch.setattr(smart_monitor, "DISCOVERY_BLOOM_FILE", tmp_path / "seen.bloom")
+    monkeypatch.setattr(smart_monitor, "probe_urls", lambda urls: {u: probes[u] for u in urls})
+    monkeypatch.setattr(smart_monitor, "get_page_info", lambda url: fetched[url])
+
+    found = smart_monitor.discover_new_pages([{"links": sorted(probes)}], set())
+    assert [info["url"] for info in found] == [f"{base}/ok"]
+    bloom = smart_monitor.BloomFilter.load(tmp_path / "seen.bloom")
+    assert f"{base}/ok" in bloom and f"{base}/gone" in bloom
+    # Network errors and server errors are probed again next run
+    for url in ("down", "busy", "flaky"):
+        assert f"{base}/{url}" not in bloom
@@ -0,0 +1,67 @@
+import json
+import os
+from pathlib import Path
+
+# Inverted index from URL to the scans that saw it appear, disappear or
+# change, so a page's timeline is one lookup instead of a pass over
+# monitoring_history.json. Updated incrementally by every scan:
+#   {"seq": last scan indexed, "urls": {url: [{"seq", "timestamp", "event", ...}, ...]}}
+EVENTS_FILE = Path("site_url_events.json")
+# Oldest events beyond this are dropped per URL
+MAX_EVENTS_PER_URL = 200
+
+_HISTORY_EVENTS = (("new_details", "new"), ("deleted_details", "deleted"), ("changed_details", "changed"))
+
+
+def load(path=EVENTS_FILE):
+    try:
+        with Path(path).open("r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save(index, path=EVENTS_FILE):
+    path = Path(path)
+    tmp = path.with_name(path.name + ".tmp")
+    with tmp.open("w", encoding="utf-8") as f:
+        json.dump(index, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp, path)
+
+
+def record(index, seq, timestamp, events):
+    # events: [(url, event, extra dict or None)] seen by scan `seq`
+    urls = index.setdefault("urls", {})
+    for url, event, extra in events:
+        entry = {"seq": seq, "timestamp": timestamp, "event": event}
+        if extra:
+            entry.update(extra)
+        timeline = urls.setdefault(url, [])
+        timeline.append(entry)
+        if len(timeline) > MAX_EVENTS_PER_URL:
+            del timeline[:-MAX_EVENTS_PER_URL]
+    index["seq"] = seq
+    return index
+
+
+def rebuild(history):
+    # One-off backfill from the history's per-scan URL lists. Entries before
+    # changed_details existed only contribute new/deleted events; a URL
+    # repeated by same-day scans (all reported against the day's baseline)
+    # counts once per day and status.
+    index = {"seq": None, "urls": {}}
+    last = {}
+    for i, entry in enumerate(history):
+        seq = entry.get("seq", i + 1)
+        events = []
+        for key, event in _HISTORY_EVENTS:
+            for url in entry.get(key) or []:
+                if last.get(url) != (event, entry.get("date")):
+                    events.append((url, event, None))
+                last[url] = (event, entry.get("date"))
+        record(index, seq, entry.get("timestamp"), events)
+    return index
+
+
+def timeline(index, url):
+    return (index.get("urls") or {}).get(url, [])
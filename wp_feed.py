@@ -0,0 +1,132 @@
+import json
+import os
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from urllib.parse import urlparse
+
+# WordPress REST API as a change feed: a few small JSON requests list the
+# posts and pages modified since the last run, so only those are downloaded.
+# Pages the API doesn't cover (archives, custom types) and sites without it
+# keep the HTML revisit schedule. State between runs:
+#   {"cursor": newest modified_gmt seen, "checked": iso when it last moved}
+FEED_FILE = Path("site_wp_feed.json")
+REST_TYPES = ("posts", "pages")
+PER_PAGE = 100
+# Pagination guard per type
+MAX_PAGES = 50
+# Items are re-listed a little before the cursor (same-second saves); the
+# stored modified_gmt per page makes re-listing harmless
+OVERLAP = timedelta(minutes=5)
+# modified_after is matched against the site's local time, so the server-side
+# filter is loosened by a day and the exact cut is made on modified_gmt here
+SERVER_FILTER_SLACK = timedelta(days=1)
+ENABLED = os.environ.get("MONITOR_WP_REST", "1") != "0"
+
+
+def api_base(sitemap_url):
+    parsed = urlparse(sitemap_url)
+    return f"{parsed.scheme}://{parsed.netloc}/wp-json/wp/v2"
+
+
+def load(path=FEED_FILE):
+    try:
+        with Path(path).open("r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save(feed, path=FEED_FILE):
+    path = Path(path)
+    tmp = path.with_name(path.name + ".tmp")
+    with tmp.open("w", encoding="utf-8") as f:
+        json.dump(feed, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+
+
+def _list_type(session, base, rest_type, since, headers, timeout):
+    # {link: modified_gmt} for one post type, newest first, down to `since`;
+    # None if the endpoint isn't usable. Also returns the request count.
+    items = {}
+    requests_made = 0
+    server_filter = since is not None
+    page = 1
+    while page <= MAX_PAGES:
+        params = {"per_page": PER_PAGE, "page": page, "orderby": "modified", "order": "desc",
+                  "_fields": "link,modified_gmt"}
+        if server_filter:
+            params["modified_after"] = (datetime.fromisoformat(since) - SERVER_FILTER_SLACK).strftime("%Y-%m-%dT%H:%M:%S")
+        response = session.get(f"{base}/{rest_type}", params=params, headers=headers, timeout=timeout)
+        requests_made += 1
+        if response.status_code == 400 and server_filter:
+            # WordPress < 5.7 has no modified_after: paginate by modified order alone
+            server_filter = False
+            continue
+        if response.status_code != 200:
+            return None, requests_made
+        try:
+            rows = response.json()
+        except ValueError:
+            return None, requests_made
+        if not isinstance(rows, list):
+            return None, requests_made
+        for row in rows:
+            link, modified = row.get("link"), row.get("modified_gmt")
+            if not link or not modified:
+                continue
+            if since and modified < since:
+                return items, requests_made
+            items[link] = modified
+        try:
+            total_pages = int(response.headers.get("X-WP-TotalPages", "1"))
+        except ValueError:
+            total_pages = 1
+        if page >= total_pages or len(rows) < PER_PAGE:
+            break
+        page += 1
+    return items, requests_made
+
+
+def changed_since(session, base, cursor, headers=None, timeout=12):
+    # ({link: modified_gmt}, requests) for everything modified after the
+    # cursor (everything, on the first run), or (None, requests) when the
+    # REST API is missing or broken and the scan should rely on HTML
+    since = (datetime.fromisoformat(cursor) - OVERLAP).strftime("%Y-%m-%dT%H:%M:%S") if cursor else None
+    listing = {}
+    total_requests = 0
+    for rest_type in REST_TYPES:
+        try:
+            items, requests_made = _list_type(session, base, rest_type, since, headers, timeout)
+        except Exception as e:
+            print(f"⚠️ WordPress REST feed failed ({rest_type}): {e}")
+            return None, total_requests
+        total_requests += requests_made
+        if items is None:
+            return None, total_requests
+        listing.update(items)
+    return listing, total_requests
+
+
+def is_newer(modified_gmt, entry):
+    # Whether a listed page changed since we last saw it: against the
+    # modified_gmt stored at that time, or else against when we last checked
+    if entry.get("wp_modified"):
+        return modified_gmt > entry["wp_modified"]
+    last_checked = entry.get("last_checked")
+    if not last_checked:
+        return True
+    # last_checked is naive local time; modified_gmt is naive UTC
+    try:
+        checked_utc = datetime.fromisoformat(last_checked).astimezone(timezone.utc).replace(tzinfo=None)
+    except ValueError:
+        return True
+    return modified_gmt > checked_utc.strftime("%Y-%m-%dT%H:%M:%S")
+
+
+def next_cursor(feed, listing, now_iso):
+    # The same feed while nothing newer was listed, so a quiet run leaves
+    # the file untouched
+    cursor = max([feed.get("cursor") or ""] + list(listing.values())) or None
+    if feed and cursor == feed.get("cursor"):
+        return feed
+    return {"cursor": cursor, "checked": now_iso}